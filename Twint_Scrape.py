@@ -5,6 +5,15 @@ Given the USERNAME of said university, this program leverages Twint (twitter web
 to retrive all tweets published (and possibly deleted) from the given DATE until the present time
 that the program was run.
 
+Several usernames are scraped concurrently with scrape_concurrently: each one gets its own
+twint configuration and event loop, in a bounded pool of threads, and is retried (after a
+growing delay) when its search fails or takes too long. twint.run.Search can be replaced
+by a stub to scrape offline.
+
+Scraping is incremental by default: the id and date of the newest tweet of each dataset
+are recorded next to it, and only the tweets published since are scraped and appended
+to the dataset.
+
 Copyright and Usage Information
 ===============================
 
@@ -19,32 +28,265 @@ This file is Copyright (c) 2021:
     Hyun Bin Antonio Kim
     Minh Ngoc Le
 """
+import asyncio
+import csv
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, Optional
+
 import twint
 
+from fileio import atomic_write
+
 # date of inital covid-19 outbreak
 DATE = '2020-03-20'
 
-# initial configuration
-c = twint.Config()
-c.Since = DATE
-c.Retweets = True
-c.Count = True
-c.Limit = 5000
-c.Store_csv = True
-c.Hide_output = True
+# maximum number of tweets scraped per username
+LIMIT = 5000
+
+# directory the datasets are stored in
+DIRECTORY = 'Datasets'
+
+# number of usernames scraped at once, seconds a search may take before it is retried,
+# number of retries, and seconds waited before the first retry (doubled before each next one)
+WORKERS = 4
+TIMEOUT = 600
+RETRIES = 2
+BACKOFF = 5
+
+
+def make_config(username: str, output: str, since: str = DATE) -> twint.Config:
+    """
+    Return a new twint configuration searching the tweets of username since the date
+    (YYYY-MM-DD, optionally followed by HH:MM:SS) since, stored as a .csv file at output.
+    """
+    config = twint.Config()
+    config.Since = since
+    config.Retweets = True
+    config.Count = True
+    config.Limit = LIMIT
+    config.Store_csv = True
+    config.Hide_output = True
+    config.Username = username
+    config.Output = output
+    return config
+
+
+def dataset_filename(username: str) -> str:
+    """Return the filename of the stored tweets of username."""
+    return 'Tweets_Dataset_' + username + '.csv'
+
 
+def state_path(path: Path) -> Path:
+    """Return the path of the record of the newest tweet of the dataset at path."""
+    return path.with_name(path.name + '.state.json')
 
-def collect_tweets(username: str) -> str:
+
+def collect_tweets(username: str, directory: str = DIRECTORY, incremental: bool = True) -> str:
     """
     Return the filename of stored tweets from the given username. Tweets are scraped
-    using twint library by a username search. File stored as a .csv file.
+    using twint library by a username search. File stored as a .csv file in directory.
+
+    If incremental, only the tweets published since the newest tweet already stored are
+    scraped, and appended to the stored ones.
     """
+    path = Path(directory) / dataset_filename(username)
+    partial = path.with_name(path.name + '.part')
+    search_tweets(username, str(partial), _since(path, incremental))
+    _publish(partial, path, incremental)
+    return path.name
 
-    # configuration
-    c.Username = username
-    c.Output = './Datasets/Tweets_Dataset_' + username + '.csv'
 
-    # running search
-    twint.run.Search(c)
+def search_tweets(username: str, output: str, since: str = DATE) -> None:
+    """
+    Store the tweets of username published since since at output with twint's search, on
+    a new event loop of the calling thread, so that searches can run in several threads at
+    once. Return None.
+    """
+    if os.path.exists(output):
+        os.remove(output)
 
-    return 'Tweets_Dataset_' + username + '.csv'
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        twint.run.Search(make_config(username, output, since))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def collect_tweets_with_retries(username: str, directory: str = DIRECTORY,
+                                incremental: bool = True, timeout: float = TIMEOUT,
+                                retries: int = RETRIES, backoff: float = BACKOFF) -> str:
+    """
+    Return the filename of stored tweets from the given username, like collect_tweets,
+    retrying the search up to retries times when it raises an error or does not finish
+    within timeout seconds. Before each retry, wait backoff seconds, doubled every time.
+    Raise the last error if every attempt failed.
+
+    A search that timed out cannot be stopped: it is left running in the background,
+    storing its tweets in a file of its own attempt that is never used. These files are
+    removed once an attempt succeeds, and any left behind are removed by the next call.
+    """
+    path = Path(directory) / dataset_filename(username)
+    _remove_partials(path)
+    since = _since(path, incremental)
+    error = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            print(f'! Scraping {username} failed ({error}), retrying.')
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+        partial = path.with_name(f'{path.name}.part{attempt}')
+        outcome = {}
+        thread = threading.Thread(target=_attempt,
+                                  args=(username, str(partial), since, outcome), daemon=True)
+        thread.start()
+        thread.join(timeout)
+
+        if outcome.get('done'):
+            _publish(partial, path, incremental)
+            _remove_partials(path)
+            return path.name
+        error = outcome.get('error',
+                            TimeoutError(f'search took longer than {timeout} seconds'))
+
+    raise error
+
+
+def _attempt(username: str, output: str, since: str, outcome: dict) -> None:
+    """
+    Run search_tweets(username, output, since), then set outcome['done'], or store the
+    error it raised in outcome['error']. Return None.
+    """
+    try:
+        search_tweets(username, output, since)
+        outcome['done'] = True
+    except Exception as error:  # reported by collect_tweets_with_retries
+        outcome['error'] = error
+
+
+def _remove_partials(path: Path) -> None:
+    """Remove the searches of every attempt to scrape the dataset at path. Return None."""
+    for partial in path.parent.glob(glob.escape(path.name) + '.part*'):
+        partial.unlink(missing_ok=True)
+
+
+def _since(path: Path, incremental: bool) -> str:
+    """
+    Return the date and time of the newest tweet stored at path if incremental and there
+    is one, or DATE otherwise.
+    """
+    newest = _newest_tweet(path) if incremental else None
+    return DATE if newest is None else newest['date']
+
+
+def _publish(partial: Path, path: Path, incremental: bool) -> None:
+    """
+    Replace the dataset at path with the complete search stored at partial, or, if
+    incremental, append the tweets of partial newer than the newest one of the dataset to
+    it. Either way the dataset is replaced atomically, so that an interrupted search never
+    leaves a partial dataset behind, and the newest tweet is recorded. Return None.
+    """
+    # twint creates no file when there are no tweets
+    partial.touch()
+    newest = _newest_tweet(path) if incremental else None
+
+    if newest is not None:
+        with open(partial, newline='', encoding='utf-8') as file:
+            new_rows = [row for row in csv.reader(file)
+                        if (_tweet_id(row) or 0) > newest['id']]
+        partial.unlink()
+        if not new_rows:
+            return
+
+        # The dataset is copied, so that the appended rows only appear all at once
+        appended = path.with_name(path.name + '.append')
+        shutil.copyfile(path, appended)
+        with open(appended, 'a', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows(new_rows)
+        partial = appended
+
+    os.replace(partial, path)
+    _write_state(path, _scan_newest_tweet(path))
+
+
+def _newest_tweet(path: Path) -> Optional[dict]:
+    """
+    Return the id and date (YYYY-MM-DD HH:MM:SS) of the newest tweet stored at path, or
+    None if there is none. The record kept by _publish is used while the dataset's size
+    still matches it; otherwise the dataset is scanned again.
+    """
+    if not path.exists():
+        return None
+    try:
+        with open(state_path(path)) as file:
+            state = json.load(file)
+        if state['size'] == os.stat(path).st_size:
+            return state['newest']
+    except (OSError, ValueError, KeyError):
+        pass
+    newest = _scan_newest_tweet(path)
+    _write_state(path, newest)
+    return newest
+
+
+def _scan_newest_tweet(path: Path) -> Optional[dict]:
+    """
+    Return the id and date (YYYY-MM-DD HH:MM:SS) of the tweet with the largest id in the
+    twint .csv file at path, or None if there is none.
+    """
+    newest = None
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            tweet_id = _tweet_id(row)
+            if tweet_id is not None and (newest is None or tweet_id > newest['id']):
+                newest = {'id': tweet_id, 'date': f'{row[3]} {row[4]}'.strip()}
+    return newest
+
+
+def _tweet_id(row: list[str]) -> Optional[int]:
+    """
+    Return the id of the tweet of a row of a twint .csv file, or None if it is the header
+    or has no valid id. Rows without one are never taken as the newest tweet, nor appended
+    by an incremental scrape (dedup.tweet_key keys them by their contents instead).
+    """
+    return int(row[0]) if row and row[0].isdigit() else None
+
+
+def _write_state(path: Path, newest: Optional[dict]) -> None:
+    """
+    Atomically record newest as the newest tweet of the dataset at path, along with the
+    dataset's size. Return None.
+    """
+    with atomic_write(state_path(path)) as file:
+        json.dump({'size': os.stat(path).st_size, 'newest': newest}, file)
+
+
+def scrape_concurrently(usernames: list[str], workers: int = WORKERS,
+                        directory: str = DIRECTORY, incremental: bool = True,
+                        timeout: float = TIMEOUT, retries: int = RETRIES,
+                        backoff: float = BACKOFF) \
+        -> Iterator[tuple[str, Optional[str], Optional[Exception]]]:
+    """
+    Scrape the tweets of every username, at most workers at once, each with
+    collect_tweets_with_retries. Yield (username, filename, None) for every username
+    scraped, or (username, None, error) for every username whose attempts all failed, in
+    the order they finish.
+    """
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(collect_tweets_with_retries, username, directory,
+                                   incremental, timeout, retries, backoff): username
+                   for username in usernames}
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is None:
+                yield futures[future], future.result(), None
+            else:
+                yield futures[future], None, error
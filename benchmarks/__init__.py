@@ -0,0 +1,4 @@
+"""
+Benchmarks for the filter and visualisation pipeline. Run each one from the root of the
+repository as a module, e.g. `python -m benchmarks.bench_spatial`.
+"""
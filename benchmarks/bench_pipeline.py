@@ -0,0 +1,289 @@
+"""
+Benchmark suite of the filter and visualisation pipeline on synthetic datasets.
+
+For every size, a synthetic Ontario dataset of that many rows (and a tweet dataset a
+tenth of its size) is generated with benchmarks.synthetic. Each benchmark then runs in a
+fresh process, so that its peak RSS is its own. Throughput (rows/sec) and peak RSS are
+printed and written to a JSON file, which a later run can be compared against.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--sizes 10000 100000 ...] [--output results.json]
+                                        [--compare previous_results.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+import filter
+from benchmarks import synthetic
+
+DEFAULT_SIZES = [10_000, 100_000]
+
+# Tweet datasets are generated with this fraction of the Ontario dataset's rows
+TWEETS_FRACTION = 10
+
+
+###############################################################################
+# Part 1 - Benchmarks
+###############################################################################
+# Each benchmark takes the directory holding the synthetic datasets, and returns the
+# number of seconds its timed section took and the number of rows it processed.
+
+
+def bench_covid_cold(directory: Path) -> tuple[float, int]:
+    """creating_covid_dics for every university, parsing the csv file into the cache."""
+    rows = _use_directory(directory)
+    start = time.perf_counter()
+    filter.creating_covid_dics(filter.uni_list)
+    return time.perf_counter() - start, rows
+
+
+def bench_covid_warm(directory: Path) -> tuple[float, int]:
+    """creating_covid_dics for every university, with the csv file already cached."""
+    rows = _use_directory(directory)
+    filter.load_covid_columns(filter.COVID_CSV_PATH, filter.COVID_CACHE_DIR)
+    start = time.perf_counter()
+    filter.creating_covid_dics(filter.uni_list)
+    return time.perf_counter() - start, rows
+
+
+def bench_impact(directory: Path) -> tuple[float, int]:
+    """creating_impact_dic of one university's tweets."""
+    _use_directory(directory)
+    uni = _synthetic_university(directory)
+    start = time.perf_counter()
+    filter.creating_impact_dic(uni)
+    return time.perf_counter() - start, _count_rows(uni.tweet_csv_path)
+
+
+def bench_impact_score(directory: Path) -> tuple[float, int]:
+    """calculate_impact_score of tweets already in memory."""
+    _use_directory(directory)
+    tweets = _read_tweets(_synthetic_university(directory).tweet_csv_path)
+    matcher = filter.KeywordMatcher(filter.KEYWORDS_LIST)
+    start = time.perf_counter()
+    for tweet, hashtag in tweets:
+        filter.calculate_impact_score(tweet, hashtag, matcher)
+    return time.perf_counter() - start, len(tweets)
+
+
+def bench_haversine(directory: Path) -> tuple[float, int]:
+    """The scalar haversine of every case (in memory) to one university."""
+    _use_directory(directory)
+    latitudes, longitudes = _read_coordinates()
+    uni_latitude, uni_longitude = filter.uni_list[0].location
+    start = time.perf_counter()
+    for latitude, longitude in zip(latitudes, longitudes):
+        filter.haversine(latitude, longitude, uni_latitude, uni_longitude)
+    return time.perf_counter() - start, len(latitudes)
+
+
+def bench_haversine_matrix(directory: Path) -> tuple[float, int]:
+    """haversine_matrix of every case (in memory) to every university."""
+    _use_directory(directory)
+    latitudes, longitudes = _read_coordinates()
+    locations = np.array([uni.location for uni in filter.uni_list])
+    start = time.perf_counter()
+    for begin in range(0, len(latitudes), filter.CHUNK_SIZE):
+        filter.haversine_matrix(latitudes[begin:begin + filter.CHUNK_SIZE],
+                                longitudes[begin:begin + filter.CHUNK_SIZE], locations)
+    return time.perf_counter() - start, len(latitudes)
+
+
+def bench_graph_impact(directory: Path) -> tuple[float, int]:
+    """visualisation.graph_uni_impact_score of every university; rows are charts."""
+    import visualisation
+    _compile_synthetic(directory)
+    start = time.perf_counter()
+    for uni in filter.uni_list:
+        visualisation.graph_uni_impact_score(uni)
+    return time.perf_counter() - start, len(filter.uni_list)
+
+
+def bench_graph_covid(directory: Path) -> tuple[float, int]:
+    """visualisation.graph_individual_regional_covid of every university; rows are charts."""
+    import visualisation
+    _compile_synthetic(directory)
+    start = time.perf_counter()
+    for uni in filter.uni_list:
+        visualisation.graph_individual_regional_covid(uni)
+    return time.perf_counter() - start, len(filter.uni_list)
+
+
+BENCHMARKS: dict[str, Callable[[Path], tuple[float, int]]] = {
+    'creating_covid_dic (cold cache)': bench_covid_cold,
+    'creating_covid_dic (warm cache)': bench_covid_warm,
+    'creating_impact_dic': bench_impact,
+    'calculate_impact_score': bench_impact_score,
+    'haversine': bench_haversine,
+    'haversine_matrix': bench_haversine_matrix,
+    'graph_uni_impact_score': bench_graph_impact,
+    'graph_individual_regional_covid': bench_graph_covid,
+}
+
+
+###############################################################################
+# Part 2 - Helpers
+###############################################################################
+
+
+def _use_directory(directory: Path) -> int:
+    """Points filter at the synthetic datasets in directory, with an empty cache, and
+    returns the number of rows of the Ontario dataset."""
+    os.chdir(directory)
+    os.makedirs('output', exist_ok=True)
+    filter.COVID_CSV_PATH = str(directory / 'Ontario_Covid_Dataset.csv')
+    filter.COVID_CACHE_DIR = tempfile.mkdtemp(dir=directory)
+    return _count_rows(filter.COVID_CSV_PATH)
+
+
+def _synthetic_university(directory: Path) -> filter.University:
+    """Returns a university whose tweets are the synthetic tweets in directory."""
+    return filter.University('Synthetic University', {}, {}, filter.uni_list[0].location,
+                             str(directory / 'Tweets_Dataset_synthetic.csv'))
+
+
+def _compile_synthetic(directory: Path) -> None:
+    """Fills the series of every university from the synthetic datasets in directory."""
+    _use_directory(directory)
+    tweets_path = str(directory / 'Tweets_Dataset_synthetic.csv')
+    for uni in filter.uni_list:
+        uni.tweet_csv_path = tweets_path
+        uni.impact_dic = filter.creating_impact_dic(uni)
+    for uni, covid_dic in zip(filter.uni_list, filter.creating_covid_dics(filter.uni_list)):
+        uni.covid_dic = covid_dic
+
+
+def _count_rows(path: str) -> int:
+    """Returns the number of rows of the csv file at path, besides its header."""
+    with open(path, 'rb') as file:
+        return sum(1 for _ in file) - 1
+
+
+def _read_tweets(path: str) -> list[tuple[str, str]]:
+    """Returns the (tweet, hashtags) of every row of the tweet csv file at path."""
+    import csv
+    with open(path, encoding='utf-8') as file:
+        return [(row[10], row[18]) for row in csv.reader(file) if row[0] != 'id']
+
+
+def _read_coordinates() -> tuple[np.ndarray, np.ndarray]:
+    """Returns the case latitudes and longitudes of filter's Ontario dataset."""
+    _, latitudes, longitudes = filter.load_covid_columns(filter.COVID_CSV_PATH,
+                                                         filter.COVID_CACHE_DIR)
+    return np.array(latitudes, dtype=float), np.array(longitudes, dtype=float)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Returns the peak resident set size of this process in MiB, if it can be measured."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def _run(name: str, directory: str) -> dict:
+    """Runs the benchmark called name on the datasets in directory and returns its result."""
+    # The pipeline's progress messages would interleave with the results table
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, rows = BENCHMARKS[name](Path(directory))
+    return {'benchmark': name, 'rows': rows, 'seconds': round(seconds, 6),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mb': _peak_rss_mb()}
+
+
+###############################################################################
+# Part 3 - Running the suite
+###############################################################################
+
+
+def run_suite(sizes: list[int], names: list[str]) -> list[dict]:
+    """Returns the result of every benchmark in names for every size, printing them."""
+    results = []
+    print(f'{"benchmark":<34} {"rows":>10} {"seconds":>9} {"rows/sec":>12} {"peak RSS":>9}')
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            synthetic.write_ontario_csv(os.path.join(directory, 'Ontario_Covid_Dataset.csv'),
+                                        size)
+            synthetic.write_tweets_csv(os.path.join(directory, 'Tweets_Dataset_synthetic.csv'),
+                                       max(size // TWEETS_FRACTION, 1))
+            for name in names:
+                # A fresh process per benchmark, so peak RSS is not inherited
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) \
+                        as executor:
+                    result = {'size': size, **executor.submit(_run, name, directory).result()}
+                results.append(result)
+                rss = result['peak_rss_mb']
+                print(f'{name:<34} {result["rows"]:>10} {result["seconds"]:>9.3f} '
+                      f'{result["rows_per_second"] or 0:>12.0f} '
+                      f'{f"{rss:.0f} MiB" if rss is not None else "n/a":>9}')
+    return results
+
+
+def compare(results: list[dict], previous: list[dict]) -> None:
+    """Prints the throughput of results relative to the previous results."""
+    before = {(result['benchmark'], result['size']): result for result in previous}
+    print(f'\n{"benchmark":<34} {"size":>10} {"rows/sec change":>16}')
+    for result in results:
+        old = before.get((result['benchmark'], result['size']))
+        if old and old['rows_per_second'] and result['rows_per_second']:
+            ratio = result['rows_per_second'] / old['rows_per_second']
+            print(f'{result["benchmark"]:<34} {result["size"]:>10} {ratio:>15.2f}x')
+
+
+def _git_commit() -> Optional[str]:
+    """Returns the current git commit of the repository, if there is one."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """Runs the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='numbers of Ontario dataset rows (default: 10000 100000)')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS), metavar='NAME',
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='JSON file the results are written to')
+    parser.add_argument('--compare', help='JSON file of previous results to compare against')
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.benchmarks)
+
+    with open(args.output, 'w') as file:
+        json.dump({'commit': _git_commit(),
+                   'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'python': platform.python_version(),
+                   'machine': platform.machine(),
+                   'results': results}, file, indent=2)
+    print(f'\n~ Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file)['results'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of case-to-campus radius queries as the number of campuses grows.
+
+Compares the brute-force distance matrix (filter.within_range_mask) with the grid
+index (filter.CaseGrid) on random cases spread over southern Ontario, for 5 to 500
+randomly placed campuses.
+
+Usage: python -m benchmarks.bench_spatial [number of cases]
+"""
+import sys
+import time
+
+import numpy as np
+
+import filter
+
+CAMPUS_COUNTS = [5, 50, 100, 250, 500]
+
+# Rows of the brute-force distance matrix computed at once, to bound its memory use
+BRUTE_FORCE_CHUNK = 10_000
+
+
+def random_coordinates(n: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Returns n random (latitudes, longitudes) in southern Ontario."""
+    return rng.uniform(42.0, 46.0, n), rng.uniform(-83.0, -75.0, n)
+
+
+def brute_force(latitudes: np.ndarray, longitudes: np.ndarray, locations: np.ndarray) -> int:
+    """Returns the number of (case, campus) pairs within RADIUS, comparing every pair."""
+    matches = 0
+    for start in range(0, len(latitudes), BRUTE_FORCE_CHUNK):
+        stop = start + BRUTE_FORCE_CHUNK
+        matches += int(np.count_nonzero(filter.within_range_mask(
+            latitudes[start:stop], longitudes[start:stop], locations, filter.RADIUS)))
+    return matches
+
+
+def grid_index(latitudes: np.ndarray, longitudes: np.ndarray, locations: np.ndarray) -> int:
+    """Returns the number of (case, campus) pairs within RADIUS, using a CaseGrid."""
+    grid = filter.CaseGrid(latitudes, longitudes)
+    return sum(len(grid.query(latitude, longitude, filter.RADIUS))
+               for latitude, longitude in locations)
+
+
+def run(n_cases: int) -> None:
+    """Prints the time taken by both methods for each number of campuses."""
+    rng = np.random.default_rng(0)
+    latitudes, longitudes = random_coordinates(n_cases, rng)
+
+    print(f'{n_cases} cases')
+    print(f'{"campuses":>9} {"brute force (s)":>16} {"grid (s)":>10} {"speedup":>8}')
+    for n_campuses in CAMPUS_COUNTS:
+        locations = np.column_stack(random_coordinates(n_campuses, rng))
+
+        start = time.perf_counter()
+        expected = brute_force(latitudes, longitudes, locations)
+        brute_force_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = grid_index(latitudes, longitudes, locations)
+        grid_time = time.perf_counter() - start
+
+        assert actual == expected, 'grid and brute force disagree'
+        print(f'{n_campuses:>9} {brute_force_time:>16.3f} {grid_time:>10.3f} '
+              f'{brute_force_time / grid_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,56 @@
+"""
+Benchmark of the startup time of main.py's subcommands.
+
+Each subcommand is started in fresh processes, which import main.py and build the
+subcommand's stage (importing every module it needs) without running it. The median
+time taken by the whole process and by the imports alone is printed, along with the
+heavy libraries that were imported, which filter and plot should not need.
+
+Usage: python -m benchmarks.bench_startup [number of runs]
+"""
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = ['filter', 'correlate', 'plot']
+
+# Libraries slow to import, and only needed by some stages
+HEAVY_MODULES = ['twint', 'matplotlib', 'requests', 'tqdm']
+
+# Run in each fresh process: import main.py, build a stage, and report what it took
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+main.pipeline_stages(names=(sys.argv[1],))
+print(json.dumps({'imports_s': time.perf_counter() - started,
+                  'heavy': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+
+def measure(command: str) -> tuple[float, float, list[str]]:
+    """Returns the wall time of a process starting command, the time its imports took,
+    and the heavy modules it imported."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE, command] + HEAVY_MODULES,
+                            check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    probe = json.loads(output.splitlines()[-1])
+    return wall, probe['imports_s'], probe['heavy']
+
+
+def run(runs: int) -> None:
+    """Prints the median startup times of every command over runs processes."""
+    print(f'{"command":<10} {"process (s)":>12} {"imports (s)":>12}  heavy modules')
+    for command in COMMANDS:
+        results = [measure(command) for _ in range(runs)]
+        wall = statistics.median(result[0] for result in results)
+        imports = statistics.median(result[1] for result in results)
+        heavy = ', '.join(results[-1][2]) or '-'
+        print(f'{command:<10} {wall:>12.3f} {imports:>12.3f}  {heavy}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,101 @@
+"""
+Generators of synthetic datasets with the same schema as the real ones, so that the
+pipeline can be benchmarked without a twint scrape or the Ontario download.
+
+    - write_ontario_csv: the Ontario COVID dataset, with Accurate_Episode_Date in
+      column 1 and Reporting_PHU_Latitude/Longitude in columns 16/17
+    - write_tweets_csv: a twint csv output, with date in column 3, tweet in column 10
+      and hashtags in column 18
+
+Usage: python -m benchmarks.synthetic <directory> [number of case rows] [number of tweets]
+"""
+import csv
+import datetime
+import os
+import random
+import sys
+
+import filter
+
+ONTARIO_HEADER = ['Row_ID', 'Accurate_Episode_Date', 'Case_Reported_Date', 'Test_Reported_Date',
+                  'Specimen_Date', 'Age_Group', 'Client_Gender', 'Case_AcquisitionInfo',
+                  'Outcome1', 'Outbreak_Related', 'Reporting_PHU_ID', 'Reporting_PHU',
+                  'Reporting_PHU_Address', 'Reporting_PHU_City', 'Reporting_PHU_Postal_Code',
+                  'Reporting_PHU_Website', 'Reporting_PHU_Latitude', 'Reporting_PHU_Longitude']
+
+TWEETS_HEADER = ['id', 'conversation_id', 'created_at', 'date', 'time', 'timezone', 'user_id',
+                 'username', 'name', 'place', 'tweet', 'language', 'mentions', 'urls', 'photos',
+                 'replies_count', 'retweets_count', 'likes_count', 'hashtags', 'cashtags', 'link',
+                 'retweet', 'quote_url', 'video', 'thumbnail', 'near', 'geo', 'source',
+                 'user_rt_id', 'user_rt', 'retweet_id', 'reply_to', 'retweet_date', 'translate',
+                 'trans_src', 'trans_dest']
+
+# Episode dates are spread from a month before INITIAL_DATE over this many days
+DAYS = 700
+
+# Words tweets are made of, besides the keywords of filter.KEYWORDS_LIST
+FILLER_WORDS = ['the', 'our', 'students', 'campus', 'update', 'today', 'please', 'read',
+                'library', 'research', 'week', 'event', 'health', 'team', 'new', 'welcome']
+
+
+def write_ontario_csv(path: str, rows: int, seed: int = 0) -> None:
+    """Writes a synthetic Ontario COVID dataset of rows cases to path. Half of the cases
+    are clustered around filter.uni_list's universities, the rest spread over Ontario."""
+    rng = random.Random(seed)
+    first_date = filter.INITIAL_DATE - datetime.timedelta(days=30)
+    dates = [(first_date + datetime.timedelta(days=day)).isoformat() for day in range(DAYS)]
+    locations = [uni.location for uni in filter.uni_list]
+
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(ONTARIO_HEADER)
+        for row_id in range(1, rows + 1):
+            if rng.random() < 0.5:
+                latitude, longitude = rng.choice(locations)
+                latitude += rng.gauss(0, 0.04)
+                longitude += rng.gauss(0, 0.05)
+            else:
+                latitude, longitude = rng.uniform(42.0, 46.0), rng.uniform(-83.0, -75.0)
+            date = rng.choice(dates)
+            writer.writerow([row_id, date, date, date, date, '20s', 'FEMALE', 'CC',
+                             'Resolved', 'No', 2251, 'Synthetic Health', '1 Main St',
+                             'Toronto', 'M5S 1A1', 'www.example.ca',
+                             f'{latitude:.6f}', f'{longitude:.6f}'])
+
+
+def write_tweets_csv(path: str, rows: int, username: str = 'synthetic', seed: int = 0) -> None:
+    """Writes rows synthetic tweets of username to path, newest first like twint. About
+    half of them mention COVID, and most use a few keywords of filter.KEYWORDS_LIST."""
+    rng = random.Random(seed)
+    keywords = list(filter.KEYWORDS_LIST)
+    last_date = filter.INITIAL_DATE + datetime.timedelta(days=DAYS - 30)
+
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(TWEETS_HEADER)
+        for index in range(rows):
+            date = last_date - datetime.timedelta(days=index * (DAYS - 30) // max(rows, 1))
+            words = rng.choices(FILLER_WORDS, k=rng.randint(8, 30)) \
+                + rng.choices(keywords, k=rng.randint(0, 4))
+            if rng.random() < 0.5:
+                words.append(rng.choice(['COVID-19', 'covid', '#COVID19']))
+            rng.shuffle(words)
+            hashtags = rng.choice(['[]', "['covid19']", 'mask', 'vaccine', 'quarantine'])
+            row = [''] * len(TWEETS_HEADER)
+            row[0] = row[1] = str(1_300_000_000_000_000_000 - index)
+            row[3] = date.isoformat()
+            row[4] = '12:00:00'
+            row[7] = row[8] = username
+            row[10] = ' '.join(words)
+            row[11] = 'en'
+            row[18] = hashtags
+            writer.writerow(row)
+
+
+if __name__ == '__main__':
+    directory = sys.argv[1]
+    os.makedirs(directory, exist_ok=True)
+    write_ontario_csv(os.path.join(directory, 'Ontario_Covid_Dataset.csv'),
+                      int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
+    write_tweets_csv(os.path.join(directory, 'Tweets_Dataset_synthetic.csv'),
+                     int(sys.argv[3]) if len(sys.argv) > 3 else 10_000)
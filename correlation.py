@@ -0,0 +1,167 @@
+"""
+Lagged cross-correlation between universities' impact scores and local COVID cases.
+
+For every university, the weekly impact scores are correlated with the weekly COVID
+cases shifted by every lag within MAX_LAG weeks at once, with FFTs, and the lag with the
+strongest correlation is kept. All universities (and radii) are correlated together as
+one array.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import csv
+import json
+import math
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import filter
+
+# Largest lag, in weeks, between impact scores and COVID cases that is considered
+MAX_LAG = 12
+
+# Correlations of every university are written to this path, plus '.csv' and '.json'
+CORRELATIONS_PATH = 'output/correlations'
+
+###############################################################################
+# Part 1 - Cross-correlating series
+###############################################################################
+
+
+def cross_correlations(impacts: np.ndarray, cases: np.ndarray,
+                       max_lag: int = MAX_LAG) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the lags from -max_lag to max_lag weeks, and the cross-correlation of
+    impacts with cases at each of them.
+
+    impacts and cases hold weekly series along their last axis, and their other axes are
+    broadcast together, so many universities (and radii) are correlated at once. Shorter
+    series are padded with weeks of zeros. correlations[..., k] estimates the correlation
+    between a week's impact score and the cases lags[k] weeks later: a positive lag means
+    cases follow announcements. As the sample cross-correlation function of statistics,
+    it is normalized by the means and standard deviations of the whole series; constant
+    series have no correlation (nan).
+
+    >>> impacts = np.array([0, 1, 0, 0, 2, 0, 0, 0])
+    >>> lags, correlations = cross_correlations(impacts, np.roll(impacts, 2), max_lag=3)
+    >>> lags.tolist()
+    [-3, -2, -1, 0, 1, 2, 3]
+    >>> int(lags[np.argmax(correlations)])
+    2
+    """
+    length = max(np.shape(impacts)[-1], np.shape(cases)[-1])
+    impacts = _standardize(_pad(impacts, length))
+    cases = _standardize(_pad(cases, length))
+    max_lag = min(max_lag, length - 1)
+
+    # Zero-padding to at least 2 * length - 1 makes the circular correlation computed by
+    # the FFTs equal to the linear one, negative lags wrapping around to the end
+    size = 1 << (2 * length - 2).bit_length()
+    spectrum = np.conj(np.fft.rfft(impacts, size)) * np.fft.rfft(cases, size)
+    full = np.fft.irfft(spectrum, size) / length
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    return lags, full[..., lags % size]
+
+
+def best_lags(lags: np.ndarray, correlations: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the lag of the strongest (positive or negative) correlation along the last
+    axis of correlations, and that correlation. Series without any correlation get a lag
+    of 0 and a nan coefficient.
+
+    >>> best_lags(np.array([-1, 0, 1]), np.array([[0.2, -0.9, 0.5], [np.nan] * 3]))
+    (array([0, 0]), array([-0.9,  nan]))
+    """
+    strength = np.nan_to_num(np.abs(correlations), nan=-1.0)
+    best = np.argmax(strength, axis=-1)
+    coefficients = np.take_along_axis(correlations, best[..., np.newaxis], axis=-1)[..., 0]
+    return np.where(np.isnan(coefficients), 0, lags[best]), coefficients
+
+
+def _pad(series: np.ndarray, length: int) -> np.ndarray:
+    """Returns series padded with zeros along its last axis up to length."""
+    series = np.asarray(series, dtype=float)
+    widths = [(0, 0)] * (series.ndim - 1) + [(0, length - series.shape[-1])]
+    return np.pad(series, widths)
+
+
+def _standardize(series: np.ndarray) -> np.ndarray:
+    """Returns series with a mean of 0 and a standard deviation of 1 along its last axis,
+    or nan where it is constant."""
+    deviations = series - series.mean(axis=-1, keepdims=True)
+    std = series.std(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(std > 0, deviations / std, np.nan)
+
+
+###############################################################################
+# Part 2 - Correlating universities
+###############################################################################
+
+
+def correlate_universities(unis: Optional[list[filter.University]] = None,
+                           max_lag: int = MAX_LAG) -> list[dict]:
+    """Returns the best lag and its correlation between the weekly impact scores and
+    COVID cases of every university in unis (by default, filter.uni_list), whose series
+    must be compiled or loaded, for every radius of their covid_sweep.
+    """
+    if unis is None:
+        unis = filter.uni_list
+    radii = sorted(unis[0].covid_sweep) if unis else []
+
+    length = max([len(uni.impact_series.weekly()) for uni in unis]
+                 + [len(series.weekly()) for uni in unis for series in uni.covid_sweep.values()]
+                 + [1])
+    impacts = np.array([_pad(uni.impact_series.weekly(), length) for uni in unis])
+    cases = np.array([[_pad(uni.covid_sweep[radius].weekly(), length) for radius in radii]
+                      for uni in unis]).reshape(len(unis), len(radii), length)
+
+    # impacts[u, np.newaxis] is broadcast against every radius of cases[u]
+    lags, correlations = cross_correlations(impacts[:, np.newaxis, :], cases, max_lag)
+    lag, coefficient = best_lags(lags, correlations)
+
+    return [{'university': uni.display_name,
+             'radius_km': float(radius),
+             'lag_weeks': int(lag[u, r]),
+             'coefficient': None if math.isnan(coefficient[u, r])
+             else round(float(coefficient[u, r]), 4)}
+            for u, uni in enumerate(unis) for r, radius in enumerate(radii)]
+
+
+def write_correlations(results: list[dict], path: str = CORRELATIONS_PATH) -> list[str]:
+    """Writes results of correlate_universities to path + '.csv' and path + '.json', and
+    returns the paths of both files."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    csv_path, json_path = f'{path}.csv', f'{path}.json'
+
+    with open(csv_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, ['university', 'radius_km', 'lag_weeks', 'coefficient'])
+        writer.writeheader()
+        writer.writerows(results)
+
+    with open(json_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    return [csv_path, json_path]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'math'],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
@@ -0,0 +1,168 @@
+"""
+De-duplication of the scraped tweet datasets.
+
+Overlapping or repeated scrapes (and retweets) can store the same tweet several times in
+a dataset, which would then be scored several times. Each dataset is copied to DIRECTORY
+without its duplicate rows, keyed on their tweet id, or on a hash of their contents if
+they have no valid id.
+
+The keys already seen are kept next to each copy as a sorted int64 array, along with how
+far the dataset was read. Since the scraper only appends tweets to the datasets, every
+later run only reads the rows added since, looking their keys up by binary search.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import csv
+import hashlib
+import io
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import instrument
+from fileio import atomic_write
+
+# Directory the de-duplicated datasets are stored in
+DIRECTORY = 'Datasets/deduplicated'
+
+# Number of bytes at the end of the rows already read that are hashed, to recognize the
+# same dataset with rows appended
+TAIL_SIZE = 1 << 16
+
+
+def deduplicated_path(path: str, directory: str = DIRECTORY) -> str:
+    """Return the path of the de-duplicated copy of the tweet dataset at path."""
+    return str(Path(directory) / Path(path).name)
+
+
+def index_path(output: str) -> Path:
+    """Return the path of the index of the keys stored in the de-duplicated dataset at
+    output."""
+    return Path(output + '.seen.npz')
+
+
+def tweet_key(row: list[str]) -> int:
+    """Return the key identifying the tweet of a row of a twint .csv file: its id, or if it
+    has none, a hash of its other fields, which is negative so as not to collide with ids.
+
+    >>> tweet_key(['1350000000000000001', '2021-01-15', 'covid update'])
+    1350000000000000001
+    >>> tweet_key(['', '2021-01-15', 'covid update']) < 0
+    True
+    """
+    if row and row[0].isdigit() and int(row[0]) < 1 << 63:
+        return int(row[0])
+    digest = hashlib.blake2b('\x1f'.join(row[1:]).encode('utf-8'), digest_size=8).digest()
+    return -(int.from_bytes(digest, 'big') >> 1) - 1
+
+
+def deduplicate(path: str, output: Optional[str] = None) -> tuple[int, int]:
+    """Append the rows of the tweet dataset at path not yet read to its de-duplicated copy
+    at output (by default, deduplicated_path(path)), except those whose key was already
+    seen, and return the number of rows read and the number of duplicates dropped.
+
+    The copy is started over whenever the dataset is not the one last read with rows
+    appended, e.g. after scraping it again from scratch.
+    """
+    if output is None:
+        output = deduplicated_path(path)
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    index = _read_index(path, output)
+
+    with open(path, 'rb') as raw_data:
+        # The scraper replaces the dataset rather than writing to it, so it stays this size
+        offset = os.fstat(raw_data.fileno()).st_size
+        raw_data.seek(index['offset'])
+        rows = [row for row in csv.reader(io.TextIOWrapper(raw_data, encoding='utf-8',
+                                                           newline=''))
+                if row]
+
+    header = [row for row in rows if row[0] == 'id'][:1]
+    rows = [row for row in rows if row[0] != 'id']
+    keys = np.array([tweet_key(row) for row in rows], dtype=np.int64)
+
+    # A row is new if its key was not seen before, nor earlier within the new rows
+    seen = index['seen']
+    positions = np.searchsorted(seen, keys)
+    known = (positions < len(seen)) & (seen[np.minimum(positions, len(seen) - 1)] == keys) \
+        if len(seen) else np.zeros(len(keys), dtype=bool)
+    first = np.zeros(len(keys), dtype=bool)
+    first[np.unique(keys, return_index=True)[1]] = True
+    new = first & ~known
+
+    # Rows written after the index was last saved are dropped, as they will be read again
+    with open(output, 'r+b' if os.path.exists(output) else 'wb') as raw_output:
+        raw_output.truncate(index['size'])
+        raw_output.seek(index['size'])
+        file = io.TextIOWrapper(raw_output, encoding='utf-8', newline='')
+        writer = csv.writer(file)
+        if index['size'] == 0:
+            writer.writerows(header)
+        writer.writerows(row for row, is_new in zip(rows, new) if is_new)
+        file.flush()
+        file.detach()
+
+    new_keys = np.sort(keys[new])
+    _write_index(output, {'seen': np.insert(seen, np.searchsorted(seen, new_keys), new_keys),
+                          'offset': offset,
+                          'tail': _tail_digest(path, offset),
+                          'size': os.stat(output).st_size})
+
+    instrument.count('tweets deduplicated', len(rows))
+    instrument.count('duplicate tweets dropped', len(rows) - int(np.count_nonzero(new)))
+    return len(rows), len(rows) - int(np.count_nonzero(new))
+
+
+def _read_index(path: str, output: str) -> dict:
+    """Return the index of the de-duplicated copy at output of the dataset at path, or an
+    empty one if there is none, or it is not of the dataset at path with rows appended."""
+    empty = {'seen': np.zeros(0, dtype=np.int64), 'offset': 0, 'tail': '', 'size': 0}
+    if not index_path(output).exists() or not os.path.exists(output):
+        return empty
+
+    with np.load(index_path(output)) as stored:
+        index = {'seen': stored['seen'], 'offset': int(stored['offset']),
+                 'tail': str(stored['tail']), 'size': int(stored['size'])}
+    if os.stat(path).st_size < index['offset'] or os.stat(output).st_size < index['size'] \
+            or _tail_digest(path, index['offset']) != index['tail']:
+        return empty
+    return index
+
+
+def _write_index(output: str, index: dict) -> None:
+    """Atomically store index as the index of the de-duplicated dataset at output."""
+    with atomic_write(index_path(output), 'wb') as file:
+        np.savez(file, seen=index['seen'], offset=np.int64(index['offset']),
+                 tail=np.array(index['tail']), size=np.int64(index['size']))
+
+
+def _tail_digest(path: str, length: int) -> str:
+    """Return the hexadecimal SHA-256 hash of the last TAIL_SIZE bytes (at most) of the
+    first length bytes of the file at path."""
+    with open(path, 'rb') as file:
+        file.seek(max(length - TAIL_SIZE, 0))
+        return hashlib.sha256(file.read(min(length, TAIL_SIZE))).hexdigest()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['python_ta.contracts', 'math'],
+        'max-line-length': 100,
+        'disable': ['R1705', 'C0200']
+    })
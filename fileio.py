@@ -0,0 +1,93 @@
+"""
+Helpers shared by the modules that store datasets, caches and indexes on disk.
+
+Files are replaced atomically with atomic_write, so that an interrupted run never leaves
+a partially written file behind, and identified by the SHA-256 hash of their contents,
+which cached_digest only computes again when a file's size or modification time changed.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterator, Union
+
+
+@contextmanager
+def atomic_write(path: Union[str, Path], mode: str = 'w', **kwargs: Any) -> Iterator[IO]:
+    """Open a temporary file next to path with mode (and the other arguments of open), and
+    replace the file at path with it once the context exits. If the context raises an
+    error, the temporary file is removed and the file at path is left unchanged.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     with atomic_write(Path(directory) / 'data.txt') as file:
+    ...         _ = file.write('written')
+    ...     sorted(os.listdir(directory)), (Path(directory) / 'data.txt').read_text()
+    (['data.txt'], 'written')
+    """
+    path = Path(path)
+    temporary = path.with_name(path.name + '.tmp')
+    try:
+        # The file is closed (and flushed) before it replaces the one at path
+        with open(temporary, mode, **kwargs) as file:
+            yield file
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+    os.replace(temporary, path)
+
+
+def file_digests(path: Union[str, Path], prefix_length: int = 0) -> tuple[str, str]:
+    """Return the hexadecimal SHA-256 hashes of the first prefix_length bytes of the file
+    at path and of the whole file, reading it only once."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        digest.update(file.read(prefix_length))
+        prefix_digest = digest.hexdigest()
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return prefix_digest, digest.hexdigest()
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """Return the hexadecimal SHA-256 hash of the contents of the file at path."""
+    return file_digests(path)[1]
+
+
+def file_fingerprint(path: Union[str, Path]) -> dict:
+    """Return the size, modification time and SHA-256 content hash of the file at path."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_digest(path)}
+
+
+def cached_digest(path: Union[str, Path], files: dict[str, dict]) -> str:
+    """Return the SHA-256 hash of the contents of the file at path, or '' if it does not
+    exist. files maps the paths hashed before to their file_fingerprint, which is reused
+    while the file's size and modification time are unchanged, so that unchanged (large)
+    files are not read again."""
+    if not os.path.isfile(path):
+        return ''
+
+    stat = os.stat(path)
+    known = files.get(str(path))
+    if known is not None and known['size'] == stat.st_size \
+            and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['sha256']
+
+    files[str(path)] = file_fingerprint(path)
+    return files[str(path)]['sha256']
+
@@ -17,7 +17,21 @@ This file is Copyright (c) 2021:
 """
 import csv
 import datetime
-from math import sqrt, sin, asin, radians
+import io
+import json
+import os
+from pathlib import Path
+from math import sqrt, sin, asin, radians, cos, ceil, pi, nan
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+import numpy as np
+
+import instrument
+from fileio import atomic_write, file_digest, file_digests, file_fingerprint
+from series import DailySeries
+from store import SeriesStore
 
 INITIAL_DATE = datetime.date(2020, 3, 20)
 
@@ -55,10 +69,44 @@ KEYWORDS_LIST = {
 
 RADIUS = 5
 
+# Radii (in km) of the COVID cases counted by a radius sweep, see creating_covid_sweep
+RADII = (1, 2, 5, 10, 25)
+
+# Number of Ontario dataset rows whose distances are computed together
+CHUNK_SIZE = 100_000
+
+COVID_CSV_PATH = 'Datasets/Ontario_Covid_Dataset.csv'
+
+# Binary columns parsed out of COVID_CSV_PATH, see load_covid_columns
+COVID_CACHE_DIR = 'Datasets/cache'
+COVID_COLUMN_NAMES = ('days', 'latitudes', 'longitudes')
+
+# Daily COVID cases of each university, up to a checkpoint, see creating_covid_dics
+COVID_COUNTS_PATH = 'Datasets/cache/covid_counts.json'
+
+# Store of the compiled series of every university, see save_series
+SERIES_PATH = 'Datasets/cache/series_store.npz'
+
+# Registry of the universities studied, see load_universities
+UNIVERSITIES_PATH = str(Path(__file__).with_name('universities.csv'))
+
+# Number of universities processed by a single task, see compile_universities
+BATCH_SIZE = 25
+
+# Kilometres per degree of latitude, on the same earth radius haversine uses
+KM_PER_DEGREE = 2 * pi * 6378 / 360
+
+# Cases whose approximate distance is this close (in km) to a radius are
+# checked with the exact haversine formula
+BOUNDARY_MARGIN = 0.05
+
 
 class University:
     """
-    Defines all neccessary attributes, getters for each university.
+    Defines all neccessary attributes, getters for each university. impact_dic and
+    covid_dic map weeks to their totals, and are views of the daily impact_series and
+    covid_series. covid_sweep holds the daily COVID cases within every radius counted,
+    including RADIUS. handle is the university's twitter username.
 
     Representation Invariants:
         - self.display_name != ''
@@ -69,52 +117,121 @@ class University:
     """
     tweet_csv_path: str
     display_name: str
+    handle: str
     impact_dic: dict[int, int]
     covid_dic: dict[int, int]
+    impact_series: DailySeries
+    covid_series: DailySeries
+    covid_sweep: dict[float, DailySeries]
     location: tuple[float, float]
 
     def __init__(self, display_name: str, impact_dic: dict[int, int], covid_dic: dict[int, int], 
-                 location: tuple[float, float], tweet_csv_path: str) -> None:
+                 location: tuple[float, float], tweet_csv_path: str, handle: str = '') -> None:
         self.display_name = display_name
+        self.handle = handle
         self.impact_dic = impact_dic
         self.covid_dic = covid_dic
         self.location = location
         self.tweet_csv_path = tweet_csv_path
+        self.impact_series = DailySeries()
+        self.covid_series = DailySeries()
+        self.covid_sweep = {}
+
+
+def load_universities(path: str = UNIVERSITIES_PATH) -> list[University]:
+    """Returns a University for every row of the registry csv file at path, in order.
+
+    Each row holds a university's display_name, twitter handle, latitude and longitude,
+    and optionally the tweet_csv_path of its tweets (by default, the dataset main.py
+    scrapes for its handle). Display names must be unique.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        unis = [University(display_name=row['display_name'],
+                           impact_dic={},
+                           covid_dic={},
+                           location=(float(row['latitude']), float(row['longitude'])),
+                           tweet_csv_path=row.get('tweet_csv_path')
+                           or f'Datasets/Tweets_Dataset_{row["handle"]}.csv',
+                           handle=row['handle'])
+                for row in csv.DictReader(file)]
+
+    names = [uni.display_name for uni in unis]
+    if len(set(names)) != len(names):
+        raise ValueError(f'{path} lists a university more than once')
+    return unis
+
+
+def batch_length(count: int, batch_size: int = BATCH_SIZE, workers: int = 1) -> int:
+    """Returns the number of universities in each batch when count universities are
+    processed at most batch_size at a time: fewer, if that leaves some of the workers
+    without a batch.
+
+    >>> batch_length(300, 25, 4), batch_length(5, 25, 4), batch_length(5, 25, 1)
+    (25, 2, 5)
+    """
+    return max(1, min(batch_size, ceil(count / max(workers, 1))))
+
+
+def batches(unis: list[University], batch_size: int = BATCH_SIZE,
+            workers: int = 1) -> Iterator[list[University]]:
+    """Yields consecutive batches of the universities of unis, of batch_length universities
+    each (except perhaps the last one), so that every worker gets a batch.
+
+    >>> [len(batch) for batch in batches(uni_list * 5, 10)]
+    [10, 10, 5]
+    >>> [len(batch) for batch in batches(uni_list, 10, workers=4)]
+    [2, 2, 1]
+    """
+    length = batch_length(len(unis), batch_size, workers)
+    for start in range(0, len(unis), length):
+        yield unis[start:start + length]
+
+
+def batch_name(kind: str, unis: list[University]) -> str:
+    """Returns the name of the stage processing kind (such as 'tweets') for the batch of
+    universities unis."""
+    if len(unis) == 1:
+        return f'{kind} {unis[0].display_name}'
+    return f'{kind} {unis[0].display_name} - {unis[-1].display_name}'
+
+
+# Initializing all the universities listed in the registry
+uni_list = load_universities()
 
 
-# Initializing all the universities
-brocku = University(display_name='Brock University',
-                    impact_dic={},
-                    covid_dic={},
-                    location=(43.117573, -79.247692),
-                    tweet_csv_path='Datasets/Tweets_Dataset_BrockUniversity.csv')
+# Memoized results of day_offset, for each initial date
+_day_offset_memo: dict[datetime.date, dict[str, int]] = {}
 
-queensu = University(display_name='Queens\' University',
-                     impact_dic={},
-                     covid_dic={},
-                     location=(44.224997, -76.495099),
-                     tweet_csv_path='Datasets/Tweets_Dataset_queensu.csv')
 
-uoft = University(display_name='University of Toronto',
-                  impact_dic={},
-                  covid_dic={},
-                  location=(43.664486, -79.399689),
-                  tweet_csv_path='Datasets/Tweets_Dataset_UofT.csv')
+def day_offset(date: str) -> int:
+    """Returns the number of days since INITIAL_DATE of date, in a YYYY-MM-DD format.
 
-uw = University(display_name='University of Waterloo',
-                impact_dic={},
-                covid_dic={},
-                location=(43.467998128, -80.537331184),
-                tweet_csv_path='Datasets/Tweets_Dataset_UWaterloo.csv')
+    Datasets only hold about a thousand distinct dates, so each is parsed once and
+    remembered.
+
+    >>> day_offset('2020-03-27')
+    7
+    >>> day_offset('2020-03-01')
+    -19
+    """
+    memo = _day_offset_memo.get(INITIAL_DATE)
+    if memo is None:
+        memo = _day_offset_memo[INITIAL_DATE] = {}
+
+    if date not in memo:
+        memo[date] = (datetime.datetime.strptime(date, "%Y-%m-%d").date() - INITIAL_DATE).days
+    return memo[date]
 
-westernu = University(display_name='Western University',
-                      impact_dic={},
-                      covid_dic={},
-                      location=(43.009953, -81.273613),
-                      tweet_csv_path='Datasets/Tweets_Dataset_WesternU.csv')
 
+def day_offsets(dates: list[str]) -> np.ndarray:
+    """Returns the number of days since INITIAL_DATE of each date, in a YYYY-MM-DD format,
+    parsing the whole column of dates at once with NumPy.
 
-uni_list = [brocku, queensu, uoft, uw, westernu]
+    >>> day_offsets(['2020-03-27', '2020-03-01']).tolist()
+    [7, -19]
+    """
+    parsed = np.array(dates, dtype='datetime64[D]')
+    return (parsed - np.datetime64(INITIAL_DATE, 'D')).astype(np.int64)
 
 ###############################################################################
 # Part 1 - Creating impact_dic from filtering twitter
@@ -122,7 +239,25 @@ uni_list = [brocku, queensu, uoft, uw, westernu]
 
 
 def creating_impact_dic(uni: University) -> dict:
-    """Creates an impact dic for a singular university
+    """Creates an impact dic for a singular university, mapping each week since
+    March 20, 2020 to its cumulative impact score."""
+    return creating_impact_series(uni).as_dict()
+
+
+def creating_impact_batch(unis: list[University]) -> list[DailySeries]:
+    """Creates the daily impact scores of every university in unis, in the same order.
+    Each university is timed as a stage of its own."""
+    impact_series = []
+    for uni in unis:
+        with instrument.stage(f'{uni.display_name} tweets'):
+            impact_series.append(creating_impact_series(uni))
+    return impact_series
+
+
+def creating_impact_series(uni: University,
+                           matcher: Optional['KeywordMatcher'] = None) -> DailySeries:
+    """Creates the daily impact scores of a singular university. Keywords are found with
+    matcher, by default KEYWORDS_MATCHER.
 
         Processes all universities' tweets to only retain useful data. We do this by:
          1. Keeping only columns 'tweet', 'created_at' and 'name'
@@ -135,10 +270,16 @@ def creating_impact_dic(uni: University) -> dict:
         # Reading the csv file
         csv_reader = csv.reader(f)
 
-        # Creating impact_dic, which contains maps all impact scores to its date
-        impact_dic = {}
+        # Parallel lists of each tweet's date and impact score
+        days = []
+        impact_scores = []
+        tweets_read = 0
+        if matcher is None:
+            matcher = KEYWORDS_MATCHER
         for row in csv_reader:
             if row[0] != 'id':
+                tweets_read += 1
+
                 # Implementing step 1 of docstring
                 tweet = row[10]
                 hashtag = row[18]
@@ -148,56 +289,119 @@ def creating_impact_dic(uni: University) -> dict:
                     date = row[3]
 
                     # Implementing step 3 of docstring
-                    impact_score = calculate_impact_score(tweet, hashtag)
+                    impact_scores.append(calculate_impact_score(tweet, hashtag, matcher))
 
                     # Converting string to an integer representing days since March 20, 2020
-                    dt_object = datetime.datetime.strptime(
-                        date, "%Y-%m-%d").date()
-
-                    delta = dt_object - INITIAL_DATE
-
-                    # Appending our useful values
-                    if delta.days not in impact_dic:
-                        impact_dic[delta.days] = impact_score
-                    else:
-                        impact_dic[delta.days] += impact_score
-
-        # Converting impact_dic into a dictionary that maps week to its cumulative impact scores
-        dates = list(impact_dic)
-        dates.reverse()
-        cases = list(impact_dic.values())
-        cases.reverse()
-
-        week_dic = {}
-        week_cumulative = 0
-        week_number = 0
-        for date, case in zip(dates, cases):
-            if date % 7 == 0 and date != 0:
-                week_cumulative += case
-                week_dic[week_number] = week_cumulative
-                week_number += 1
-                week_cumulative = 0
-            else:
-                week_cumulative += case
-        return week_dic
-
-
-def calculate_impact_score(tweet: str, hashtag: str) -> int:
+                    days.append(day_offset(date))
+
+        instrument.count('tweets read', tweets_read)
+        instrument.count('tweets scored', len(impact_scores))
+
+        # Summing the impact scores of each day
+        return DailySeries.from_days(days, impact_scores)
+
+
+class KeywordMatcher:
+    """
+    An Aho-Corasick automaton that finds every keyword of a weighted lexicon contained in
+    a text, in a single pass over the text.
+
+    A keyword counts once no matter how often it appears, and keywords that overlap
+    (such as 'social distancing' and 'distancing') are all found, exactly like checking
+    `keyword in text` for each keyword.
+
+    Instance Attributes:
+        - weights: the impact score of each keyword
+
+    Representation Invariants:
+        - '' not in self.weights
+
+    >>> matcher = KeywordMatcher({'distancing': 6, 'social distancing': 5, 'stay': 1})
+    >>> sorted(matcher.find('stay home, keep social distancing, stay safe'))
+    ['distancing', 'social distancing', 'stay']
+    >>> matcher.score('stay home, keep social distancing, stay safe')
+    12
+    """
+    weights: dict[str, int]
+    _goto: list[dict[str, int]]
+    _fail: list[int]
+    _output: list[tuple[str, ...]]
+
+    def __init__(self, weights: dict[str, int]) -> None:
+        self.weights = dict(weights)
+
+        # Trie of all keywords: state 0 is the root, and _output[state] holds the keywords
+        # ending at that state
+        self._goto = [{}]
+        output = [[]]
+        for keyword in self.weights:
+            state = 0
+            for character in keyword:
+                if character not in self._goto[state]:
+                    self._goto.append({})
+                    output.append([])
+                    self._goto[state][character] = len(self._goto) - 1
+                state = self._goto[state][character]
+            output[state].append(keyword)
+
+        # Failure links, in breadth-first order: the state for the longest proper suffix of
+        # a state's text that is also in the trie. A state also outputs its suffixes' keywords.
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail != 0 and character not in self._goto[fail]:
+                    fail = self._fail[fail]
+                if state != 0 and character in self._goto[fail]:
+                    fail = self._goto[fail][character]
+                self._fail[next_state] = fail
+                output[next_state].extend(output[fail])
+        self._output = [tuple(keywords) for keywords in output]
+
+    def find(self, text: str) -> set[str]:
+        """Returns the set of keywords contained in text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for character in text:
+            while state != 0 and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def score(self, text: str) -> int:
+        """Returns the sum of the weights of the keywords contained in text."""
+        return sum(self.weights[keyword] for keyword in self.find(text))
+
+
+# Matcher of KEYWORDS_LIST, built once and shared by every tweet scored
+KEYWORDS_MATCHER = KeywordMatcher(KEYWORDS_LIST)
+
+
+def calculate_impact_score(tweet: str, hashtag: str,
+                           matcher: Optional[KeywordMatcher] = None) -> int:
     """
-    Returns impact score for each tweet based on keyword dictionary.
+    Returns impact score for each tweet based on keyword dictionary. Keywords are found
+    with matcher, by default KEYWORDS_MATCHER.
 
     >>> calculate_impact_score('Please stay safe during COVID-19 epidemic!', '#COVID19')
     5
     >>> calculate_impact_score('During COVID-19 we where able to raise funds for the homeless', '#UOFT')
     0
+    >>> calculate_impact_score('Practice social distancing', '[]')
+    11
     """
-    cumulative_impact_score = 0
+    if matcher is None:
+        matcher = KEYWORDS_MATCHER
 
     # If a key from KEYWORDS_LIST is present in a tweet or hashtag, then the key's impact score
     # is summed to the day's cumulative_impact_score
-    for keyword in KEYWORDS_LIST:
-        if keyword in tweet:
-            cumulative_impact_score += KEYWORDS_LIST[keyword]
+    cumulative_impact_score = matcher.score(tweet)
 
     if hashtag in KEYWORDS_LIST:
         cumulative_impact_score += KEYWORDS_LIST[hashtag]
@@ -210,64 +414,378 @@ def calculate_impact_score(tweet: str, hashtag: str) -> int:
 ###############################################################################
 
 def creating_covid_dic(uni: University) -> dict:
-    """Returns a dictionary mapping the amount of COVID-cases to a day."""
-    with open('Datasets/Ontario_Covid_Dataset.csv', encoding="utf-8") as covid_data:
-        csv_reader = csv.reader(covid_data)
+    """Returns a dictionary mapping the amount of COVID-cases to a week."""
+    return creating_covid_dics([uni])[0]
+
+
+def creating_covid_dics(unis: list[University], incremental: bool = False,
+                        workers: int = 1) -> list[dict]:
+    """Returns a covid_dic for every university in unis, in the same order. See
+    creating_covid_series."""
+    return [series.as_dict() for series in creating_covid_series(unis, incremental, workers)]
+
+
+def creating_covid_series(unis: list[University], incremental: bool = False,
+                          workers: int = 1) -> list[DailySeries]:
+    """Returns the daily COVID cases within RADIUS of every university in unis, in the
+    same order.
+
+    The cached Ontario dataset columns are read only once, CHUNK_SIZE rows at a time.
+    The cases of each chunk are indexed in a CaseGrid, so every university is only
+    compared with the cases in the grid cells around it. With more than one worker,
+    the chunks are counted in that many processes.
+
+    If incremental is True, the daily cases of every university are stored in
+    COVID_COUNTS_PATH, and the next incremental call only counts the rows appended to
+    the Ontario dataset since. The counts are rebuilt from the first row whenever the
+    dataset was rewritten rather than appended to.
+    """
+    load_covid_columns(COVID_CSV_PATH, COVID_CACHE_DIR)
+
+    if incremental:
+        return updating_covid_cases(unis, COVID_CACHE_DIR, workers)
+    else:
+        return counting_covid_cases(unis, COVID_CACHE_DIR, workers=workers)
+
+
+def counting_covid_cases(unis: list[University], cache_dir: str, start_row: int = 0,
+                         workers: int = 1) -> list[DailySeries]:
+    """Returns the daily number of COVID cases within RADIUS of each university in unis,
+    counting the rows cached in cache_dir from start_row onwards.
+
+    With more than one worker, chunks of rows are counted in a pool of that many
+    processes.
+    """
+    series = [DailySeries() for _ in unis]
+    if not unis:
+        return series
+
+    locations = np.array([uni.location for uni in unis], dtype=float).reshape(-1, 2)
+    rows = len(np.load(Path(cache_dir) / f'{COVID_COLUMN_NAMES[0]}.npy', mmap_mode='r'))
+    starts = list(range(start_row, rows, CHUNK_SIZE))
+    stops = [min(start + CHUNK_SIZE, rows) for start in starts]
+    arguments = ([cache_dir] * len(starts), starts, stops, [locations] * len(starts),
+                 [RADIUS] * len(starts))
+
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(counting_chunk_cases, *arguments))
+    else:
+        chunk_results = map(counting_chunk_cases, *arguments)
+
+    for start, stop, chunk_counts in zip(starts, stops, chunk_results):
+        series = [total + DailySeries(counts) for total, counts in zip(series, chunk_counts)]
+        instrument.count('case rows read', stop - start)
+        instrument.count('case rows matched', sum(int(counts.sum()) for counts in chunk_counts))
+
+    return series
+
+
+def counting_chunk_cases(cache_dir: str, start: int, stop: int, locations: np.ndarray,
+                         radius: float) -> list[np.ndarray]:
+    """Returns the daily number of COVID cases within radius of each location, counting
+    the rows cached in cache_dir from start up to stop."""
+    days, grid = _loading_chunk_cases(cache_dir, start, stop)
+
+    # Counting the days of the cases within range of each university
+    return [np.bincount(days[grid.query(location[0], location[1], radius)])
+            for location in locations]
+
+
+def _loading_chunk_cases(cache_dir: str, start: int, stop: int,
+                         cell_km: float = RADIUS) -> tuple[np.ndarray, 'CaseGrid']:
+    """Returns the days since March 20, 2020 of the cases cached in cache_dir from start up
+    to stop, and a CaseGrid of their coordinates. Earlier cases are left out."""
+    all_days, all_latitudes, all_longitudes = (
+        np.load(Path(cache_dir) / f'{name}.npy', mmap_mode='r') for name in COVID_COLUMN_NAMES)
+    days = all_days[start:stop].astype(np.int64)
+    latitudes = all_latitudes[start:stop]
+    longitudes = all_longitudes[start:stop]
+
+    # Starts counting covid cases since March 20th, 2020
+    counted = days >= 0
+    return days[counted], CaseGrid(latitudes[counted], longitudes[counted], cell_km)
+
+
+def creating_covid_sweep(unis: list[University], radii: tuple[float, ...] = RADII,
+                         workers: int = 1) -> np.ndarray:
+    """Returns the array of the weekly COVID cases within each of radii (in km) of every
+    university in unis: sweep[u, r, w] is the number of cases within radii[r] of unis[u]
+    in week w since March 20, 2020. radii must be increasing.
+
+    Every university's distance to every nearby case is only computed once, in a single
+    pass over the Ontario dataset, however many radii there are.
+    """
+    load_covid_columns(COVID_CSV_PATH, COVID_CACHE_DIR)
+    daily = counting_covid_sweep(unis, radii, COVID_CACHE_DIR, workers)
+
+    # Summing the days of each week, the last one possibly incomplete
+    weeks = -(-daily.shape[2] // 7)
+    padded = np.zeros(daily.shape[:2] + (weeks * 7,), dtype=np.int64)
+    padded[:, :, :daily.shape[2]] = daily
+    return padded.reshape(daily.shape[:2] + (weeks, 7)).sum(axis=3)
+
+
+def counting_covid_sweep(unis: list[University], radii: tuple[float, ...], cache_dir: str,
+                         workers: int = 1) -> np.ndarray:
+    """Returns the array of the daily COVID cases within each of radii of every university
+    in unis, counting the rows cached in cache_dir: sweep[u, r, d] is the number of cases
+    within radii[r] of unis[u] on day d. radii must be increasing.
+
+    With more than one worker, chunks of rows are counted in a pool of that many
+    processes.
+    """
+    if list(radii) != sorted(radii) or not radii or radii[0] <= 0:
+        raise ValueError(f'radii must be positive and increasing, not {radii}')
+
+    locations = np.array([uni.location for uni in unis], dtype=float).reshape(-1, 2)
+    rows = len(np.load(Path(cache_dir) / f'{COVID_COLUMN_NAMES[0]}.npy', mmap_mode='r'))
+    starts = list(range(0, rows, CHUNK_SIZE))
+    stops = [min(start + CHUNK_SIZE, rows) for start in starts]
+    arguments = ([cache_dir] * len(starts), starts, stops, [locations] * len(starts),
+                 [tuple(radii)] * len(starts))
+
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(counting_chunk_sweep, *arguments))
+    else:
+        chunk_results = map(counting_chunk_sweep, *arguments)
 
-        dates = []
-        covid_cases = []
+    sweep = np.zeros((len(unis), len(radii), 0), dtype=np.int64)
+    for start, stop, chunk_sweep in zip(starts, stops, chunk_results):
+        if chunk_sweep.shape[2] > sweep.shape[2]:
+            sweep = np.pad(sweep, ((0, 0), (0, 0), (0, chunk_sweep.shape[2] - sweep.shape[2])))
+        sweep[:, :, :chunk_sweep.shape[2]] += chunk_sweep
+        instrument.count('case rows read', stop - start)
 
+    return sweep
+
+
+def counting_chunk_sweep(cache_dir: str, start: int, stop: int, locations: np.ndarray,
+                         radii: tuple[float, ...]) -> np.ndarray:
+    """Returns the daily number of COVID cases within each of radii of each location,
+    counting the rows cached in cache_dir from start up to stop, as an array indexed by
+    location, radius and day. radii must be increasing."""
+    days, grid = _loading_chunk_cases(cache_dir, start, stop, cell_km=radii[-1])
+    length = int(days.max()) + 1 if days.size > 0 else 0
+    radii = np.asarray(radii, dtype=float)
+
+    counts = np.zeros((len(locations), len(radii) * length), dtype=np.int64)
+    for index, location in enumerate(locations):
+        nearby = grid.query(location[0], location[1], radii[-1])
+        distances = haversine_matrix(grid.latitudes[nearby], grid.longitudes[nearby],
+                                     location)[:, 0]
+
+        # Binning each case by the smallest radius it is within, then counting its day
+        # in that radius' row
+        bins = np.searchsorted(radii, distances)
+        kept = bins < len(radii)
+        counts[index] = np.bincount(bins[kept] * length + days[nearby][kept],
+                                    minlength=len(radii) * length)
+
+    # A case within a radius is within every larger radius too
+    return np.cumsum(counts.reshape(len(locations), len(radii), length), axis=1)
+
+
+def updating_covid_cases(unis: list[University], cache_dir: str, workers: int = 1) \
+        -> list[DailySeries]:
+    """Returns the same daily cases as counting_covid_cases, reusing the counts stored at
+    COVID_COUNTS_PATH by the previous call and only counting the rows added since.
+    The updated counts are stored back at COVID_COUNTS_PATH."""
+    meta = _read_json(Path(cache_dir) / 'meta.json')
+    counts_path = Path(COVID_COUNTS_PATH)
+    checkpoint = _read_json(counts_path)
+
+    # The stored counts are only a valid prefix if the rows they were counted from are
+    # still the first rows of the dataset
+    stored = {}
+    start_row = 0
+    if 'daily_cases' in checkpoint \
+            and checkpoint.get('radius') == RADIUS \
+            and checkpoint.get('initial_date') == INITIAL_DATE.isoformat() \
+            and {'rows': checkpoint['rows'], 'sha256': checkpoint['sha256']} \
+            in meta['history'] + [{'rows': meta['rows'], 'sha256': meta['sha256']}]:
+        stored = checkpoint['daily_cases']
+        start_row = checkpoint['rows']
+
+    keys = [_university_key(uni) for uni in unis]
+    stored_indices = [i for i, key in enumerate(keys) if key in stored]
+    new_indices = [i for i, key in enumerate(keys) if key not in stored]
+
+    series = [DailySeries() for _ in unis]
+    for i, new_series in zip(new_indices, counting_covid_cases(
+            [unis[i] for i in new_indices], cache_dir, workers=workers)):
+        series[i] = new_series
+
+    # Adding the new rows to the stored counts
+    for i, new_series in zip(stored_indices, counting_covid_cases(
+            [unis[i] for i in stored_indices], cache_dir, start_row, workers)):
+        series[i] = DailySeries(stored[keys[i]]) + new_series
+
+    counts_path.parent.mkdir(parents=True, exist_ok=True)
+    _write_json(counts_path, {
+        'rows': meta['rows'],
+        'sha256': meta['sha256'],
+        'radius': RADIUS,
+        'initial_date': INITIAL_DATE.isoformat(),
+        'daily_cases': {key: uni_series.counts.tolist()
+                        for key, uni_series in zip(keys, series)}
+    })
+    return series
+
+
+def _university_key(uni: University) -> str:
+    """Returns the key identifying uni's stored COVID case counts."""
+    return f'{uni.display_name}|{uni.location[0]}|{uni.location[1]}'
+
+
+def load_covid_columns(csv_path: str = COVID_CSV_PATH, cache_dir: str = COVID_CACHE_DIR) \
+        -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the (days since March 20, 2020, case latitudes, case longitudes) columns of
+    the Ontario dataset at csv_path, as read-only memory-mapped arrays.
+
+    The csv file is only parsed the first time: the columns are stored in cache_dir as
+    int16 and float32 .npy files, next to a fingerprint of the csv file. When rows have only
+    been appended to the csv file, just those rows are parsed and added to the cache.
+    Otherwise the cache is rebuilt whenever the csv file's contents change.
+    """
+    cache = Path(cache_dir)
+    meta_path = cache / 'meta.json'
+    meta = _read_json(meta_path)
+    status, digest = _covid_cache_status(csv_path, meta_path, meta)
+
+    if status == 'appended':
+        print('~ Caching rows appended to the Ontario COVID dataset.')
+        old_columns = [np.load(cache / f'{name}.npy') for name in COVID_COLUMN_NAMES]
+        new_columns = _parse_covid_columns(csv_path, meta['size'])
+        _write_covid_cache(cache, [np.concatenate(pair) for pair in zip(old_columns, new_columns)],
+                           {'size': os.stat(csv_path).st_size,
+                            'mtime_ns': os.stat(csv_path).st_mtime_ns,
+                            'sha256': digest,
+                            'rows': meta['rows'] + len(new_columns[0]),
+                            'initial_date': INITIAL_DATE.isoformat(),
+                            'history': meta['history'] + [{'rows': meta['rows'],
+                                                           'sha256': meta['sha256']}]})
+    elif status == 'stale':
+        print('~ Caching Ontario COVID dataset columns. This only happens when it changes.')
+        columns = _parse_covid_columns(csv_path)
+        _write_covid_cache(cache, columns, {**file_fingerprint(csv_path),
+                                            'rows': len(columns[0]),
+                                            'initial_date': INITIAL_DATE.isoformat(),
+                                            'history': []})
+
+    return tuple(np.load(cache / f'{name}.npy', mmap_mode='r') for name in COVID_COLUMN_NAMES)
+
+
+def _covid_cache_status(csv_path: str, meta_path: Path, meta: dict) -> tuple[str, str]:
+    """Returns how the cache described by meta (stored at meta_path) relates to the current
+    contents of csv_path: 'valid', 'appended' (the csv file only gained rows at its end) or 'stale',
+    along with the new SHA-256 hash of the csv file when it is 'appended'.
+
+    The file's size and modification time are compared first; the (slower) content hash
+    is only recomputed when they differ, so that a touched but unchanged file keeps its cache.
+    """
+    if meta.get('initial_date') != INITIAL_DATE.isoformat():
+        return 'stale', ''
+
+    stat = os.stat(csv_path)
+    if stat.st_size == meta['size'] and stat.st_mtime_ns == meta['mtime_ns']:
+        return 'valid', ''
+
+    if stat.st_size == meta['size']:
+        if file_digest(csv_path) != meta['sha256']:
+            return 'stale', ''
+        # Same contents with a new modification time
+        _write_json(meta_path, {**meta, 'mtime_ns': stat.st_mtime_ns})
+        return 'valid', ''
+
+    if stat.st_size > meta['size'] and _ends_with_newline(csv_path, meta['size']):
+        prefix_digest, digest = file_digests(csv_path, meta['size'])
+        if prefix_digest == meta['sha256']:
+            return 'appended', digest
+
+    return 'stale', ''
+
+
+def _parse_covid_columns(csv_path: str, offset: int = 0) -> list[np.ndarray]:
+    """Returns the cached columns of the rows of csv_path from byte offset onwards."""
+    chunks = list(read_covid_chunks(csv_path, offset=offset))
+    days = np.concatenate([chunk[0] for chunk in chunks]) if chunks else np.empty(0)
+    if days.size > 0 and (days.min() < np.iinfo(np.int16).min
+                          or days.max() > np.iinfo(np.int16).max):
+        raise ValueError(f'{csv_path} has episode dates too far from {INITIAL_DATE}')
+    return [days.astype(np.int16),
+            np.concatenate([chunk[1] for chunk in chunks] or [[]]).astype(np.float32),
+            np.concatenate([chunk[2] for chunk in chunks] or [[]]).astype(np.float32)]
+
+
+def _write_covid_cache(cache: Path, columns: list[np.ndarray], meta: dict) -> None:
+    """Stores columns in cache, followed by meta describing the csv file they came from."""
+    cache.mkdir(parents=True, exist_ok=True)
+
+    # Write every column before the fingerprint, so an interrupted build is redone
+    meta_path = cache / 'meta.json'
+    if meta_path.exists():
+        os.remove(meta_path)
+    for name, column in zip(COVID_COLUMN_NAMES, columns):
+        with atomic_write(cache / f'{name}.npy', 'wb') as file:
+            np.save(file, column)
+    _write_json(meta_path, meta)
+
+
+def _ends_with_newline(path: str, length: int) -> bool:
+    """Returns whether the first length bytes of the file at path end with a line break."""
+    if length == 0:
+        return True
+    with open(path, 'rb') as file:
+        file.seek(length - 1)
+        return file.read(1) == b'\n'
+
+
+def _read_json(path: Path) -> dict:
+    """Returns the JSON object stored at path, or an empty dictionary if there is none."""
+    if not path.exists():
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_json(path: Path, data: dict) -> None:
+    """Atomically replaces the file at path with data, written as JSON."""
+    with atomic_write(path) as file:
+        json.dump(data, file)
+
+
+def read_covid_chunks(csv_path: str = COVID_CSV_PATH, chunk_size: int = CHUNK_SIZE,
+                      offset: int = 0) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yields (days since March 20, 2020, case latitudes, case longitudes) arrays for
+    consecutive chunks of at most chunk_size rows of the Ontario dataset, starting from
+    the row at byte offset. Blank or malformed coordinates are read as NaN, so that the
+    case is never counted near any university."""
+    with open(csv_path, 'rb') as raw_data:
+        raw_data.seek(offset)
+        covid_data = io.TextIOWrapper(raw_data, encoding="utf-8")
+        csv_reader = csv.reader(covid_data)
+
+        dates, latitudes, longitudes = [], [], []
         for row in csv_reader:
             date = row[1]
             if date != 'Accurate_Episode_Date':  # to forcefully ignore first line
-                case_latitude = row[16]
-                case_longitude = row[17]
-
-                # convert string to an integer representing days since march 20, 2020
-                dt_object = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-                delta = dt_object - INITIAL_DATE
-
-                # Starts counting covid cases since March 20th, 2020
-                if delta.days >= 0:
-                    uni_latitude = uni.location[0]
-                    uni_longitude = uni.location[1]
-
-                    # If university is within range, add the values to that
-                    # specific university's lists.
-                    if within_range(
-                            float(case_latitude),
-                            float(case_longitude),
-                            uni_latitude,
-                            uni_longitude,
-                            RADIUS):
-                        if delta.days not in dates:
-                            dates.append(delta.days)
-                            covid_cases.append(1)
-                        else:
-                            index = dates.index(delta.days)
-                            covid_cases[index] += 1
-
-        # return file in dictionary format for convenient use in visualization
-        covid_dic = {date: covid_cases for date,
-                     covid_cases in zip(dates, covid_cases)}
-
-        # Converting covid_dic into a dictionary that maps week to its
-        # cumulative number of COVID cases
-        dates = list(covid_dic)
-        cases = list(covid_dic.values())
-
-        week_dic = {}
-        week_cumulative = 0
-        week_number = 0
-        for date, case in zip(dates, cases):
-            if date % 7 == 0 and date != 0:
-                week_cumulative += case
-                week_dic[week_number] = week_cumulative
-                week_number += 1
-                week_cumulative = 0
-            else:
-                week_cumulative += case
-        return week_dic
+                dates.append(date)
+                try:
+                    latitude, longitude = float(row[16]), float(row[17])
+                except ValueError:
+                    latitude = longitude = nan
+                latitudes.append(latitude)
+                longitudes.append(longitude)
+
+                if len(dates) == chunk_size:
+                    # convert strings to integers representing days since march 20, 2020
+                    yield day_offsets(dates), np.array(latitudes), np.array(longitudes)
+                    dates, latitudes, longitudes = [], [], []
+
+        if dates:
+            yield day_offsets(dates), np.array(latitudes), np.array(longitudes)
 
 
 def within_range(lat1: float, long1: float, lat2: float, long2: float, range: float) -> bool:
@@ -306,21 +824,235 @@ def haversine(lat1: float, long1: float, lat2: float, long2: float) -> float:
     return d
 
 
+def within_range_mask(latitudes: np.ndarray, longitudes: np.ndarray,
+                      locations: np.ndarray, range: float) -> np.ndarray:
+    """Returns a boolean matrix whose [i, j] entry is whether case i is within range km
+    of location j. locations is an array of (latitude, longitude) rows."""
+    return haversine_matrix(latitudes, longitudes, locations) <= range
+
+
+def haversine_matrix(latitudes: np.ndarray, longitudes: np.ndarray,
+                     locations: np.ndarray) -> np.ndarray:
+    """Returns the matrix of distances between every case and every location, using the
+    same formula as haversine. Row i holds the distances from
+    (latitudes[i], longitudes[i]) to each (latitude, longitude) row of locations.
+
+    >>> import math
+    >>> bahen = (43.65983570963418, -79.39694225927128)
+    >>> margad = (43.668387110900944, -79.39244320160002)
+    >>> output = haversine_matrix(np.array([bahen[0]]), np.array([bahen[1]]), np.array([margad]))
+    >>> output.shape
+    (1, 1)
+    >>> math.isclose(output[0, 0], haversine(bahen[0], bahen[1], margad[0], margad[1]))
+    True
+    """
+    # change degree values of latitude and longitude into radians, with cases as
+    # rows and locations as columns
+    lat1 = np.radians(np.asarray(latitudes, dtype=float))[:, np.newaxis]
+    long1 = np.radians(np.asarray(longitudes, dtype=float))[:, np.newaxis]
+    locations = np.radians(np.asarray(locations, dtype=float).reshape(-1, 2))
+    lat2 = locations[:, 0][np.newaxis, :]
+    long2 = locations[:, 1][np.newaxis, :]
+
+    r = 6378  # the average distance from earth's core to the surface
+
+    # Calculate distance between every pair of locations
+    return 2 * r * np.arcsin(
+        np.sqrt(
+            (np.sin((lat2 - lat1) / 2)) ** 2
+            + (1 - ((np.sin(lat2 - lat1) / 2) ** 2)
+               - ((np.sin((lat2 + lat1) / 2)) ** 2))
+            * (np.sin(long2 - long1) / 2) ** 2
+        )
+    )
+
+
+class CaseGrid:
+    """A spatial index of case coordinates, bucketed into a latitude/longitude grid.
+
+    Every cell is at least cell_km wide, so the cases within range km of a location can
+    only be in the cells surrounding the location's own cell.
+
+    Instance Attributes:
+        - latitudes: the latitude of each indexed case
+        - longitudes: the longitude of each indexed case
+        - cell_km: the minimum width and height of a cell, in km
+
+    Representation Invariants:
+        - self.cell_km > 0
+        - self.latitudes.shape == self.longitudes.shape
+
+    >>> grid = CaseGrid(np.array([43.66, 43.66, 44.22]), np.array([-79.39, -79.50, -76.49]))
+    >>> grid.query(43.664486, -79.399689, RADIUS).tolist()
+    [0]
+    """
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    cell_km: float
+    _lat_step: float
+    _long_step: float
+    _width: int
+    _keys: np.ndarray
+    _order: np.ndarray
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray,
+                 cell_km: float = RADIUS) -> None:
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.cell_km = cell_km
+
+        # Cases without usable coordinates are never within range of anything
+        indexed = np.flatnonzero(np.isfinite(self.latitudes) & np.isfinite(self.longitudes))
+
+        # A degree of longitude shrinks towards the poles, so longitude cells are sized
+        # for the highest latitude in the grid (plus one cell of slack)
+        self._lat_step = cell_km / KM_PER_DEGREE
+        max_latitude = self._lat_step
+        if indexed.size > 0:
+            max_latitude += np.max(np.abs(self.latitudes[indexed]))
+        self._long_step = cell_km / (KM_PER_DEGREE * cos(radians(min(max_latitude, 89.0))))
+
+        rows = np.floor(self.latitudes[indexed] / self._lat_step).astype(np.int64)
+        columns = np.floor(self.longitudes[indexed] / self._long_step).astype(np.int64)
+        self._column_min = int(columns.min()) if indexed.size > 0 else 0
+        self._width = int(columns.max()) - self._column_min + 1 if indexed.size > 0 else 1
+
+        # Cases sorted by cell, so that a run of neighbouring cells in the same grid row
+        # is one contiguous slice
+        keys = rows * self._width + (columns - self._column_min)
+        sort = np.argsort(keys, kind='stable')
+        self._keys = keys[sort]
+        self._order = indexed[sort]
+
+    def query(self, latitude: float, longitude: float, range: float) -> np.ndarray:
+        """Returns the sorted indices of the cases within range km of (latitude, longitude).
+
+        Only the cases in nearby cells are looked at. Those clearly inside or outside
+        range are decided with a flat-earth approximation; the exact haversine formula
+        is only used for those within BOUNDARY_MARGIN of range.
+        """
+        candidates = self._candidates(latitude, longitude, range)
+
+        # Approximate distances, treating the earth as flat around the location
+        lat_km = (self.latitudes[candidates] - latitude) * KM_PER_DEGREE
+        long_km = (self.longitudes[candidates] - longitude) * KM_PER_DEGREE \
+            * np.cos(np.radians((self.latitudes[candidates] + latitude) / 2))
+        approximate = np.hypot(lat_km, long_km)
+
+        inside = approximate <= range - BOUNDARY_MARGIN
+        boundary = candidates[~inside & (approximate <= range + BOUNDARY_MARGIN)]
+        exact = haversine_matrix(self.latitudes[boundary], self.longitudes[boundary],
+                                 np.array([latitude, longitude]))[:, 0] <= range
+
+        return np.sort(np.concatenate((candidates[inside], boundary[exact])))
+
+    def _candidates(self, latitude: float, longitude: float, radius: float) -> np.ndarray:
+        """Returns the indices of the cases in the cells that could be within radius km of
+        (latitude, longitude)."""
+        span = ceil(radius / self.cell_km)
+        row = int(np.floor(latitude / self._lat_step))
+        column = int(np.floor(longitude / self._long_step)) - self._column_min
+
+        # Neighbouring columns outside the grid hold no cases
+        first_column = max(column - span, 0)
+        last_column = min(column + span, self._width - 1)
+        if first_column > last_column:
+            return np.empty(0, dtype=np.int64)
+
+        slices = []
+        for neighbour_row in range(row - span, row + span + 1):
+            start = np.searchsorted(self._keys, neighbour_row * self._width + first_column)
+            end = np.searchsorted(self._keys, neighbour_row * self._width + last_column,
+                                  side='right')
+            slices.append(self._order[start:end])
+        return np.concatenate(slices)
+
+
 ###############################################################################
 # Part 3 - Completing each universities' class representation
 ###############################################################################
 
-def compile_universities() -> None:
-    """Complete function calls for each university. """
+def compile_universities(incremental: bool = False, workers: int = 1,
+                         batch_size: int = BATCH_SIZE, radii: tuple[float, ...] = ()) -> None:
+    """Complete function calls for each university. If incremental is True, only the
+    Ontario COVID cases added since the previous incremental run are counted. With more
+    than one worker, tweets and COVID cases are processed in that many processes; the
+    results are the same as with a single worker.
+
+    Tweets are scored batch_size universities at a time (fewer if there would not be a
+    batch for every worker), each batch in a worker process of its own, while the COVID
+    cases of all universities are counted in a single pass over the Ontario dataset,
+    within RADIUS and each of radii. Cases are only counted incrementally when there are
+    no other radii than RADIUS.
+    """
     print('~ Generating data can take up to a minute. Thanks for being patient.')
-    for index, uni in enumerate(uni_list):
-        uni.impact_dic = creating_impact_dic(uni)
-        uni.covid_dic = creating_covid_dic(uni)
-        print(
-            f'~ Data for {uni.display_name} generated. {index + 1} out of {len(uni_list)} done!')
+    uni_batches = list(batches(uni_list, batch_size, workers))
+    names = [batch_name('tweets', batch) for batch in uni_batches]
+
+    if workers > 1 and len(uni_batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            all_batch_series = []
+            for batch_series, records in executor.map(
+                    instrument.in_worker, names,
+                    [creating_impact_batch] * len(uni_batches), uni_batches):
+                instrument.adopt(records)
+                all_batch_series.append(batch_series)
+    else:
+        all_batch_series = []
+        for name, batch in zip(names, uni_batches):
+            with instrument.stage(name):
+                all_batch_series.append(creating_impact_batch(batch))
+
+    for batch, batch_series in zip(uni_batches, all_batch_series):
+        for uni, series in zip(batch, batch_series):
+            uni.impact_series = series
+            uni.impact_dic = series.as_dict()
+    print(f'~ Tweets scored for all {len(uni_list)} universities.')
+
+    # All universities share a single pass over the Ontario dataset
+    radii = tuple(sorted(set(radii) | {RADIUS}))
+    with instrument.stage('covid cases'):
+        if radii == (RADIUS,):
+            sweeps = [[series] for series in creating_covid_series(uni_list, incremental,
+                                                                   workers)]
+        else:
+            load_covid_columns(COVID_CSV_PATH, COVID_CACHE_DIR)
+            sweeps = [[DailySeries(counts) for counts in uni_counts] for uni_counts
+                      in counting_covid_sweep(uni_list, radii, COVID_CACHE_DIR, workers)]
+    for uni, sweep in zip(uni_list, sweeps):
+        uni.covid_sweep = dict(zip(radii, sweep))
+        uni.covid_series = uni.covid_sweep[RADIUS]
+        uni.covid_dic = uni.covid_series.as_dict()
+    print('~ COVID cases assigned to all universities.')
     print('! Classes created for all universities.')
 
 
+def save_series(path: str = SERIES_PATH) -> None:
+    """Stores the daily impact_series and covid_sweep of every university in uni_list in a
+    SeriesStore at path, so that they can be queried (or loaded back) without compiling
+    them again."""
+    radii = sorted(uni_list[0].covid_sweep) if uni_list else [RADIUS]
+    SeriesStore([uni.display_name for uni in uni_list], radii, INITIAL_DATE,
+                [uni.impact_series for uni in uni_list],
+                [[uni.covid_sweep[radius] for radius in radii] for uni in uni_list],
+                radius=RADIUS).save(path)
+
+
+def load_series(path: str = SERIES_PATH) -> None:
+    """Loads the series stored at path by save_series into the universities of uni_list
+    with the same display names, along with their weekly dictionaries."""
+    store = SeriesStore.load(path)
+    for uni in uni_list:
+        if uni.display_name in store.names:
+            uni.covid_sweep = {}
+            for radius in store.radii.tolist():
+                uni.impact_series, uni.covid_sweep[radius] = store.series(uni.display_name,
+                                                                          radius)
+            uni.covid_series = uni.covid_sweep[store.radius]
+            uni.impact_dic = uni.impact_series.as_dict()
+            uni.covid_dic = uni.covid_series.as_dict()
+
+
 if __name__ == '__main__':
     import python_ta
 
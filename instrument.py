@@ -0,0 +1,216 @@
+"""
+Lightweight timing and throughput instrumentation of the pipeline's stages.
+
+Code is divided into (nested) stages with the stage context manager or the timed
+decorator. Each stage records its wall time, CPU time (including finished worker
+processes), how much its process's resident memory and peak resident memory (and that
+of its largest finished worker process) grew, and any counts made with count while it
+was running, such as rows read or tweets scored. If memory is traced (see configure),
+each stage also records the peak memory allocated while it ran. The records
+are written as a JSON run report with write_report. One stage can also be profiled with
+cProfile, see configure.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import cProfile
+import datetime
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+# Finished stages, in the order they finished
+_records: list[dict] = []
+
+# Names, counts and peak traced memory (so far) of the stages currently running, outermost
+# first
+_stack: list[tuple[str, dict[str, int], dict[str, int]]] = []
+
+# Stage to profile with cProfile, and the directory its profile is dumped in
+_profile_stage: Optional[str] = None
+_profile_dir = Path('.')
+
+
+def configure(profile_stage: Optional[str] = None, profile_dir: str = '.',
+              trace_memory: bool = False) -> None:
+    """Profile the stage called profile_stage (its full name, such as 'filter/covid cases')
+    with cProfile whenever it runs, dumping the profile in profile_dir. If trace_memory,
+    trace the memory allocated by Python (and NumPy) with tracemalloc, which slows the
+    pipeline down, to record the peak of every stage above the memory already allocated
+    when it started. Return None."""
+    global _profile_stage, _profile_dir
+    _profile_stage = profile_stage
+    _profile_dir = Path(profile_dir)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        # Worker processes started afresh (rather than forked) trace from their start too
+        os.environ['PYTHONTRACEMALLOC'] = '1'
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record the wall time, CPU time, memory and counts of the code run within this
+    context as the stage called name, nested within the stages already running."""
+    # tracemalloc keeps a single peak: the enclosing stage's peak so far is kept aside
+    # before it is reset for this stage, and this stage's peak is added back to it after
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if _stack:
+            _fold_peak(_stack[-1][2], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        started_traced = tracemalloc.get_traced_memory()[0]
+    _stack.append((name, {}, {'peak': 0}))
+    full_name = '/'.join(stage[0] for stage in _stack)
+
+    profiler = cProfile.Profile() if full_name == _profile_stage else None
+    started_wall = time.perf_counter()
+    started_cpu = _cpu_time()
+    started_rss = _rss_mb()
+    started_peaks = _peak_rss_mb()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profile_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(_profile_dir / f'{full_name.replace("/", "_")}.prof')
+
+        _, counts, memory = _stack.pop()
+        peak = None
+        if tracing:
+            peak = _fold_peak(memory, tracemalloc.get_traced_memory()[1])
+            if _stack:
+                _fold_peak(_stack[-1][2], peak)
+        rss = _rss_mb()
+        peaks = _peak_rss_mb()
+        _records.append({'stage': full_name,
+                         'wall_s': round(time.perf_counter() - started_wall, 6),
+                         'cpu_s': round(_cpu_time() - started_cpu, 6),
+                         'rss_delta_mb': None if rss is None or started_rss is None
+                         else round(rss - started_rss, 1),
+                         'peak_rss_delta_mb': None if peaks is None
+                         else round(peaks[0] - started_peaks[0], 1),
+                         'child_peak_rss_delta_mb': None if peaks is None
+                         else round(peaks[1] - started_peaks[1], 1),
+                         'peak_traced_mb': None if peak is None
+                         else round((peak - started_traced) / (1 << 20), 1),
+                         'counts': counts})
+
+
+def timed(name: str) -> Callable:
+    """Decorator recording every call of the decorated function as the stage called name."""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add amount to the count called name of every stage currently running. Return None."""
+    for _, counts, _ in _stack:
+        counts[name] = counts.get(name, 0) + amount
+
+
+def in_worker(name: str, function: Callable, *args: Any) -> tuple[Any, list[dict]]:
+    """Return function(*args) and the records of running it as the stage called name.
+
+    Meant to be run in a worker process, whose stages and counts would otherwise be lost:
+    the parent process passes the records to adopt.
+    """
+    global _records, _stack
+    parent_records, parent_stack = _records, _stack
+    _records, _stack = [], []
+    try:
+        with stage(name):
+            result = function(*args)
+        return result, _records
+    finally:
+        _records, _stack = parent_records, parent_stack
+
+
+def adopt(records: list[dict]) -> None:
+    """Add records made by in_worker (in another process) as stages nested within the
+    stages currently running, whose counts they add to. Return None."""
+    prefix = ''.join(f'{stage[0]}/' for stage in _stack)
+    for record in records:
+        _records.append({**record, 'stage': prefix + record['stage']})
+
+    # The outermost record holds the counts of all the others
+    if records:
+        for name, amount in records[-1]['counts'].items():
+            count(name, amount)
+
+
+def report() -> dict:
+    """Return the run report: every finished stage's record, outermost stages last."""
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'argv': sys.argv,
+            'stages': list(_records)}
+
+
+def write_report(path: str) -> None:
+    """Write the run report to path as JSON. Return None."""
+    with open(path, 'w') as file:
+        json.dump(report(), file, indent=2)
+
+
+def reset() -> None:
+    """Forget every finished stage. Return None."""
+    _records.clear()
+
+
+def _cpu_time() -> float:
+    """Return the CPU time used by this process and its finished child processes."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _rss_mb() -> Optional[float]:
+    """Return the resident set size in MiB of this process, if it can be measured."""
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):  # not Linux
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+
+
+def _peak_rss_mb() -> Optional[tuple[float, float]]:
+    """Return the peak resident set sizes in MiB of this process and of its largest
+    finished child process, if they can be measured."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    unit = 1 << 20 if sys.platform == 'darwin' else 1 << 10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit)
+
+
+def _fold_peak(memory: dict[str, int], peak: int) -> int:
+    """Raise the peak traced memory recorded in memory to peak, and return it."""
+    memory['peak'] = max(memory['peak'], peak)
+    return memory['peak']
@@ -1,6 +1,12 @@
 """
 Main function.
 
+Usage: python main.py [setup | scrape | dedup | filter | correlate | plot | all] [options]
+
+Each subcommand runs one step, and all (the default) sets up then runs every stage. A
+subcommand only imports the modules its stage needs, so that e.g. plotting never waits
+for twint to be imported.
+
 Copyright and Usage Information
 ===============================
 
@@ -15,53 +21,326 @@ This file is Copyright (c) 2021:
     Hyun Bin Antonio Kim
     Minh Ngoc Le
 """
-import Twint_Scrape
-import filter
-import visualisation
-import setup
-from tqdm import tqdm
+import argparse
+import datetime
 import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import instrument
+import pipeline
+
+# Stages of the pipeline, in the order they run, after setup
+STAGES = ('scrape', 'dedup', 'filter', 'correlate', 'plot')
 
-TWITTER_HANDLES = {
-    'University of Toronto': 'UofT',
-    'Western University': 'WesternU',
-    'University of Waterloo': 'UWaterloo',
-    'Queens University': 'queensu',
-    'Brock University': 'BrockUniversity'
-}
+# Subcommands of main.py: setup, each stage, or all of them
+COMMANDS = ('setup',) + STAGES + ('all',)
 
+# Heavy libraries (twint, matplotlib, requests) are only imported by the stages needing
+# them, within the functions below, so that e.g. plotting does not wait for twint
 
-def scrape_datasets(handles: dict[str, str]) -> None:
+
+def twitter_handles() -> dict[str, str]:
+    """Return the twitter usernames of the universities listed in filter.UNIVERSITIES_PATH,
+    by display name."""
+    import filter
+    return {uni.display_name: uni.handle for uni in filter.uni_list}
+
+
+def scrape_datasets(handles: dict[str, str], workers: Optional[int] = None,
+                    incremental: bool = True) -> list[str]:
     """
     Create a .csv file dataset of tweets from each university within 'handles',
-    given the twitter username of said university. Return None.
+    given the twitter username of said university, scraping workers (by default,
+    Twint_Scrape.WORKERS) of them at once. If incremental, only tweets newer than those of
+    the existing datasets are scraped and appended to them. Return the paths of the
+    datasets. Raise a RuntimeError once every other university is scraped if any could
+    not be.
     """
-    for i in tqdm(range(len(handles.keys())),
-                  desc="Loading…",
-                  ascii=False, ncols=75):
-        uni = list(handles.keys())[i]
-        filename = Twint_Scrape.collect_tweets(handles[uni])
-        print(f'~ {uni} dataset has been stored in the file {filename}, '
-              f'within the Datasets directory')
+    import Twint_Scrape
+    from tqdm import tqdm
 
+    universities = {handle: uni for uni, handle in handles.items()}
+    paths = []
+    failed = []
+    scraped = Twint_Scrape.scrape_concurrently(list(handles.values()),
+                                               workers or Twint_Scrape.WORKERS,
+                                               incremental=incremental)
+    for handle, filename, error in tqdm(scraped, total=len(handles), desc="Loading…",
+                                        ascii=False, ncols=75):
+        if error is not None:
+            print(f'! {universities[handle]} could not be scraped: {error}')
+            failed.append(handle)
+        else:
+            instrument.count('handles scraped')
+            paths.append(str(Path(Twint_Scrape.DIRECTORY) / filename))
+            print(f'~ {universities[handle]} dataset has been stored in the file {filename}, '
+                  f'within the Datasets directory')
+
+    if failed:
+        raise RuntimeError(f'tweets of {", ".join(failed)} could not be scraped')
+    return sorted(paths)
+
+
+def run_setup() -> None:
+    """Configure twint and download the COVID dataset into ./Datasets. Return None."""
+    import setup
 
-if __name__ == "__main__":
-    # setup configuration files and Datasets
     if not os.path.exists('Datasets'):
         os.mkdir('Datasets')
-    setup.start()
-
-    # scrape for tweets
-    
-    scrape_datasets(TWITTER_HANDLES)
-    print('~ All requested university twitter accounts have been scraped for tweets')
-
-    # # filter data
-    filter.compile_universities()
-
-    # # visualize data
-    if not os.path.exists('output'):
-        os.mkdir('output')
-    visualisation.plot_impacts()
-    visualisation.plot_covid()
-    print('Successfully exported all graphs under "./output"')
+    with instrument.stage('setup'):
+        setup.start(clear=False)
+
+
+def pipeline_stages(workers: int = 1, draft: bool = False, batch_size: Optional[int] = None,
+                    radii: Optional[list[float]] = None,
+                    scrape_workers: Optional[int] = None,
+                    fresh: bool = False, names: tuple[str, ...] = STAGES,
+                    dedup: bool = False) -> list[pipeline.Stage]:
+    """
+    Return the stages of the pipeline called names, among the scrape, dedup, filter,
+    correlate and plot stages, each declaring the files and settings its results depend
+    on, so that up to date stages are skipped. Only the modules of these stages are
+    imported.
+
+    The dedup stage is optional: it only runs if named alone, or if dedup, in which case
+    the filter stage scores the de-duplicated tweets.
+
+    Universities are filtered and plotted batch_size (by default, filter.BATCH_SIZE) at a
+    time. The COVID cases within each of radii (besides filter.RADIUS) are also counted,
+    stored and correlated. New tweets are scraped at most once a day, and appended to the
+    existing datasets, unless fresh, in which case the datasets are deleted and scraped
+    from scratch.
+    """
+    if dedup and 'filter' in names:
+        names = names + ('dedup',)
+    elif names != ('dedup',):
+        names = tuple(name for name in names if name != 'dedup')
+    builders = {'scrape': lambda: scrape_stage(scrape_workers, fresh),
+                'dedup': dedup_stage,
+                'filter': lambda: filter_stage(workers, batch_size, radii, dedup),
+                'correlate': correlate_stage,
+                'plot': lambda: plot_stage(workers, draft, batch_size)}
+    return [builders[name]() for name in STAGES if name in names]
+
+
+def scrape_stage(workers: Optional[int] = None, fresh: bool = False) -> pipeline.Stage:
+    """Return the stage scraping the tweets of every university, workers at a time."""
+    import Twint_Scrape
+
+    handles = twitter_handles()
+
+    def scrape() -> list[str]:
+        if fresh:
+            import setup
+            setup.clear_data_directory()
+        paths = scrape_datasets(handles, workers, incremental=not fresh)
+        print('~ All requested university twitter accounts have been scraped for tweets')
+        return paths
+
+    return pipeline.Stage('scrape',
+                          inputs=[Twint_Scrape.__file__],
+                          config={'handles': handles, 'since': Twint_Scrape.DATE,
+                                  'limit': Twint_Scrape.LIMIT,
+                                  'day': datetime.date.today()},
+                          action=scrape)
+
+
+def dedup_stage() -> pipeline.Stage:
+    """Return the stage copying the tweets of every university without duplicates."""
+    import dedup
+    import filter
+
+    sources = [uni.tweet_csv_path for uni in filter.uni_list]
+
+    def deduplicate() -> list[str]:
+        dropped = sum(dedup.deduplicate(path)[1] for path in sources)
+        print(f'~ {dropped} duplicate tweets dropped from the datasets')
+        return [dedup.deduplicated_path(path) for path in sources]
+
+    return pipeline.Stage('dedup',
+                          inputs=sources + [dedup.__file__],
+                          config={'directory': dedup.DIRECTORY},
+                          action=deduplicate)
+
+
+def filter_stage(workers: int = 1, batch_size: Optional[int] = None,
+                 radii: Optional[list[float]] = None, dedup: bool = False) -> pipeline.Stage:
+    """Return the stage compiling the series of every university into filter.SERIES_PATH,
+    from the de-duplicated tweets if dedup."""
+    import filter
+    import series
+    import store
+
+    if dedup:
+        import dedup as deduplication
+        for uni in filter.uni_list:
+            uni.tweet_csv_path = deduplication.deduplicated_path(uni.tweet_csv_path)
+
+    def compile_series() -> list[str]:
+        filter.compile_universities(incremental=True, workers=workers,
+                                    batch_size=batch_size or filter.BATCH_SIZE,
+                                    radii=tuple(radii or ()))
+        filter.save_series(filter.SERIES_PATH)
+        return [filter.SERIES_PATH]
+
+    universities = [(uni.display_name, uni.location, uni.tweet_csv_path)
+                    for uni in filter.uni_list]
+    return pipeline.Stage('filter',
+                          inputs=[path for _, _, path in universities]
+                          + [filter.COVID_CSV_PATH, filter.__file__, series.__file__,
+                             store.__file__],
+                          config={'keywords': filter.KEYWORDS_LIST, 'radius': filter.RADIUS,
+                                  'radii': sorted(radii or []),
+                                  'initial_date': filter.INITIAL_DATE,
+                                  'universities': universities},
+                          action=compile_series)
+
+
+def correlate_stage() -> pipeline.Stage:
+    """Return the stage correlating the stored series of every university."""
+    import correlation
+    import filter
+
+    def correlate() -> list[str]:
+        filter.load_series(filter.SERIES_PATH)
+        results = correlation.correlate_universities()
+        paths = correlation.write_correlations(results, correlation.CORRELATIONS_PATH)
+        print(f'~ Correlations of all universities written to {paths[0]}')
+        return paths
+
+    return pipeline.Stage('correlate',
+                          inputs=[filter.SERIES_PATH, correlation.__file__],
+                          config={'max_lag': correlation.MAX_LAG},
+                          action=correlate)
+
+
+def plot_stage(workers: int = 1, draft: bool = False,
+               batch_size: Optional[int] = None) -> pipeline.Stage:
+    """Return the stage rendering the charts of the stored series of every university."""
+    import filter
+    import visualisation
+
+    def plot() -> list[str]:
+        filter.load_series(filter.SERIES_PATH)
+        if not os.path.exists('output'):
+            os.mkdir('output')
+        paths = visualisation.render_charts(workers=workers, draft=draft,
+                                             batch_size=batch_size or filter.BATCH_SIZE)
+        print('Successfully exported all graphs under "./output"')
+        return [str(path) for path in paths]
+
+    return pipeline.Stage('plot',
+                          inputs=[filter.SERIES_PATH, visualisation.__file__],
+                          config={'draft': draft},
+                          action=plot)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    """Return the subcommand and options given by argv, the arguments of main.py. Without
+    a subcommand, every step runs, as with 'all'."""
+    parser = argparse.ArgumentParser(description='Correlate universities\' COVID-19 '
+                                                 'announcements with local COVID-19 cases.')
+    parser.set_defaults(workers=1, batch_size=None, scrape_workers=None, radii=None,
+                        draft=False, fresh=False, dedup=False)
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    # Options shared by several subcommands
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--report', default='run_report.json',
+                        help='JSON file the timings of each stage are written to '
+                             '(default: run_report.json)')
+    common.add_argument('--profile', metavar='STAGE',
+                        help='profile a stage (such as "filter" or "filter/covid cases") '
+                             'with cProfile, dumping STAGE.prof in the current directory')
+    common.add_argument('--trace-memory', action='store_true',
+                        help='record the peak memory allocated by each stage with '
+                             'tracemalloc, which slows the run down')
+
+    scraping = argparse.ArgumentParser(add_help=False)
+    scraping.add_argument('--scrape-workers', type=int,
+                          help='number of twitter accounts scraped at once '
+                               '(default: Twint_Scrape.WORKERS)')
+    scraping.add_argument('--fresh', action='store_true',
+                          help='delete the tweets scraped so far and scrape them all again, '
+                               'rather than only the new ones')
+
+    batching = argparse.ArgumentParser(add_help=False)
+    batching.add_argument('--workers', type=int, default=1,
+                          help='number of processes used to filter the data and render '
+                               'the graphs (default: 1)')
+    batching.add_argument('--batch-size', type=int,
+                          help='number of universities whose tweets are scored and whose '
+                               'graphs are rendered together (default: filter.BATCH_SIZE)')
+
+    filtering = argparse.ArgumentParser(add_help=False)
+    filtering.add_argument('--radii', type=float, nargs='+', metavar='KM',
+                           help='also count the COVID cases within each of these radii of '
+                                'every university, storing them in the series store')
+    filtering.add_argument('--dedup', action='store_true',
+                           help='drop duplicate tweets from the datasets before scoring them')
+
+    plotting = argparse.ArgumentParser(add_help=False)
+    plotting.add_argument('--draft', action='store_true',
+                          help='export quicker, low-resolution PNG graphs')
+
+    commands.add_parser('setup', parents=[common],
+                        help='configure twint and download the COVID dataset')
+    stage_parsers = {
+        'scrape': commands.add_parser('scrape', parents=[common, scraping],
+                                      help='scrape the tweets of every university'),
+        'dedup': commands.add_parser('dedup', parents=[common],
+                                     help='copy the tweets of every university without '
+                                          'duplicates'),
+        'filter': commands.add_parser('filter', parents=[common, batching, filtering],
+                                      help='compile the series of every university'),
+        'correlate': commands.add_parser('correlate', parents=[common],
+                                         help='correlate the series of every university'),
+        'plot': commands.add_parser('plot', parents=[common, batching, plotting],
+                                    help='render the charts of every university')
+    }
+    for stage_parser in stage_parsers.values():
+        stage_parser.add_argument('--force', action='store_true',
+                                  help='run the stage even if it is up to date')
+
+    every = commands.add_parser('all', parents=[common, scraping, batching, filtering,
+                                                plotting],
+                                help='set up, then run every stage (the default)')
+    every.add_argument('--force', nargs='+', default=[], choices=STAGES,
+                       help='run these stages even if they are up to date')
+
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['all'] + argv
+    args = parser.parse_args(argv)
+
+    # Normalize --force into the names of the stages forced to run
+    if args.command == 'all':
+        args.force = list(args.force)
+    else:
+        args.force = [args.command] if getattr(args, 'force', False) else []
+    if args.fresh:
+        args.force.append('scrape')
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    instrument.configure(profile_stage=args.profile, trace_memory=args.trace_memory)
+
+    # setup configuration files and Datasets, before twint is imported
+    if args.command in ('setup', 'all'):
+        run_setup()
+
+    # scrape for tweets, filter data and visualize data, unless they are up to date; the
+    # time taken to import the modules of these stages is recorded as startup
+    if args.command != 'setup':
+        with instrument.stage('startup'):
+            stages = pipeline_stages(args.workers, args.draft, args.batch_size, args.radii,
+                                     args.scrape_workers, args.fresh,
+                                     STAGES if args.command == 'all' else (args.command,),
+                                     args.dedup)
+        pipeline.run(stages, force=tuple(args.force))
+
+    instrument.write_report(args.report)
+    print(f'~ Timings of each stage written to {args.report}')
@@ -0,0 +1,114 @@
+"""
+Build-system-style running of the pipeline's stages (scrape, filter, plot).
+
+Each Stage declares the files it reads, the configuration it depends on, and an action
+returning the files it wrote. A manifest records the content hashes of all of these
+after each run, and a stage is skipped when neither its inputs, its configuration nor
+its outputs changed since.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable
+
+import instrument
+from fileio import atomic_write, cached_digest
+
+MANIFEST_PATH = '.pipeline_manifest.json'
+
+
+class Stage:
+    """
+    A step of the pipeline that only needs to run again when what it depends on changed.
+
+    Instance Attributes:
+        - name: the name of the stage, such as 'filter'
+        - inputs: the paths of the files the stage reads (including its own source code)
+        - config: the settings the stage's outputs depend on; must be JSON serializable
+        - action: runs the stage and returns the paths of the files it wrote
+
+    Representation Invariants:
+        - self.name != ''
+    """
+    name: str
+    inputs: list[str]
+    config: dict[str, Any]
+    action: Callable[[], list[str]]
+
+    def __init__(self, name: str, inputs: list[str], config: dict[str, Any],
+                 action: Callable[[], list[str]]) -> None:
+        self.name = name
+        self.inputs = inputs
+        self.config = config
+        self.action = action
+
+
+def run(stages: list[Stage], force: tuple[str, ...] = (),
+        manifest_path: str = MANIFEST_PATH) -> list[str]:
+    """Run every stage of stages in order, skipping the up to date ones, and return the
+    names of the stages that ran. Stages named in force always run.
+
+    A stage's inputs are only hashed when it is its turn, so a stage may read the outputs
+    of the stages before it. The manifest is saved after every stage.
+    """
+    manifest = _read_manifest(manifest_path)
+    ran = []
+
+    for stage in stages:
+        key = _stage_key(stage, manifest['files'])
+        record = manifest['stages'].get(stage.name)
+
+        if stage.name not in force and record is not None and record['key'] == key \
+                and all(cached_digest(path, manifest['files']) == digest
+                        for path, digest in record['outputs'].items()):
+            print(f'~ Stage {stage.name} is up to date, skipping it.')
+            continue
+
+        with instrument.stage(stage.name):
+            outputs = stage.action()
+        ran.append(stage.name)
+
+        manifest['stages'][stage.name] = {
+            'key': key,
+            'outputs': {path: cached_digest(path, manifest['files']) for path in outputs}
+        }
+        _write_manifest(manifest_path, manifest)
+
+    return ran
+
+
+def _stage_key(stage: Stage, files: dict[str, dict]) -> str:
+    """Return a hash of stage's configuration and the contents of its inputs."""
+    key = hashlib.sha256()
+    key.update(json.dumps(stage.config, sort_keys=True, default=str).encode())
+    for path in sorted(stage.inputs):
+        key.update(f'\0{path}\0{cached_digest(path, files)}'.encode())
+    return key.hexdigest()
+
+
+def _read_manifest(path: str) -> dict:
+    """Return the manifest stored at path, or an empty one."""
+    if not os.path.exists(path):
+        return {'files': {}, 'stages': {}}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    """Atomically replace the manifest stored at path. Return None."""
+    with atomic_write(path) as file:
+        json.dump(manifest, file, indent=2)
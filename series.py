@@ -0,0 +1,216 @@
+"""
+Dense daily series of counts (COVID cases, impact scores), indexed by day offset.
+
+Series can also be turned into their cumulative sums once, after which the total of any
+window of days (a period, a calendar month, or a rolling window ending on each day) is
+the difference of two sums, so that every granularity is derived from the same daily
+counts.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import datetime
+from typing import Optional
+
+import numpy as np
+
+
+class DailySeries:
+    """
+    A value for every day since an initial date, stored in a NumPy array indexed by day
+    offset. Resampling to weeks (or any fixed period) is a single reshape and sum.
+
+    Instance Attributes:
+        - counts: counts[day] is the total for the day that many days after the initial date
+
+    Representation Invariants:
+        - self.counts.ndim == 1
+
+    >>> series = DailySeries.from_days([0, 1, 1, 9], [1, 2, 3, 4])
+    >>> series.counts.tolist()
+    [1, 5, 0, 0, 0, 0, 0, 0, 0, 4]
+    >>> series.as_dict()
+    {0: 6, 1: 4}
+    """
+    counts: np.ndarray
+
+    def __init__(self, counts: Optional[np.ndarray] = None) -> None:
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None \
+            else np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_days(cls, days: list[int], weights: Optional[list[int]] = None) -> 'DailySeries':
+        """Returns the series of the sum of weights (by default, 1) on each day in days.
+        Days before the initial date (negative days) are left out."""
+        days = np.asarray(days, dtype=np.int64)
+        kept = days >= 0
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.int64)[kept]
+        return cls(np.bincount(days[kept], weights=weights).astype(np.int64))
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, DailySeries):
+            return NotImplemented
+        return np.array_equal(np.trim_zeros(self.counts, 'b'), np.trim_zeros(other.counts, 'b'))
+
+    def __add__(self, other: 'DailySeries') -> 'DailySeries':
+        """Returns the day-by-day sum of both series."""
+        counts = np.zeros(max(len(self), len(other)), dtype=np.int64)
+        counts[:len(self)] += self.counts
+        counts[:len(other)] += other.counts
+        return DailySeries(counts)
+
+    def resample(self, period: int) -> np.ndarray:
+        """Returns the totals of consecutive periods of period days, the first one starting
+        at the initial date. The last period is kept even if it is not complete.
+
+        >>> DailySeries(np.arange(10)).resample(4).tolist()
+        [6, 22, 17]
+        """
+        padded = np.zeros(-(-len(self) // period) * period, dtype=np.int64)
+        padded[:len(self)] = self.counts
+        return padded.reshape(-1, period).sum(axis=1)
+
+    def weekly(self) -> np.ndarray:
+        """Returns the totals of each week since the initial date."""
+        return self.resample(7)
+
+    def monthly(self, initial_date: datetime.date) -> np.ndarray:
+        """Returns the totals of each calendar month, when day 0 is initial_date. The first
+        month starts on initial_date.
+
+        >>> DailySeries(np.ones(20)).monthly(datetime.date(2020, 3, 20)).tolist()
+        [12, 8]
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.add.reduceat(self.counts, month_boundaries(initial_date, 0, len(self))[:-1])
+
+    def as_dict(self, period: int = 7) -> dict[int, int]:
+        """Returns the dictionary mapping each period (by default, week) number to its total,
+        as University.impact_dic and University.covid_dic hold them."""
+        return dict(enumerate(self.resample(period).tolist()))
+
+
+class PrefixSums:
+    """
+    The cumulative sums of daily series, along the last axis of an array of any shape, from
+    which the total of any window of days is found in constant time.
+
+    Windows are given as days since the initial date, and the days outside the series
+    (before the initial date or after its last day) count as 0.
+
+    Instance Attributes:
+        - sums: sums[..., day] is the total of the days before day
+
+    Representation Invariants:
+        - self.sums.shape[-1] >= 1
+        - (self.sums[..., 0] == 0).all()
+
+    >>> sums = PrefixSums(np.arange(10))
+    >>> int(sums.window(2, 5)), sums.resample(4, epoch=-2).tolist()
+    (9, [1, 14, 30])
+    >>> sums.rolling(3).tolist()
+    [0, 1, 3, 6, 9, 12, 15, 18, 21, 24]
+    """
+    sums: np.ndarray
+
+    def __init__(self, counts: np.ndarray) -> None:
+        """Initialize the cumulative sums of counts, whose last axis is the days."""
+        counts = np.asarray(counts, dtype=np.int64)
+        self.sums = np.zeros(counts.shape[:-1] + (counts.shape[-1] + 1,), dtype=np.int64)
+        np.cumsum(counts, axis=-1, out=self.sums[..., 1:])
+
+    @classmethod
+    def from_series(cls, series: list[DailySeries]) -> 'PrefixSums':
+        """Returns the cumulative sums of every series in series, one per row."""
+        counts = np.zeros((len(series), max([len(one) for one in series] + [0])),
+                          dtype=np.int64)
+        for row, one in zip(counts, series):
+            row[:len(one)] = one.counts
+        return cls(counts)
+
+    def __getitem__(self, index: object) -> 'PrefixSums':
+        """Returns the cumulative sums of the series at index of the other axes than the
+        last one, sharing this one's array."""
+        selected = PrefixSums.__new__(PrefixSums)
+        selected.sums = self.sums[index]
+        return selected
+
+    @property
+    def days(self) -> int:
+        """The number of days of the series."""
+        return self.sums.shape[-1] - 1
+
+    def totals(self, boundaries: np.ndarray) -> np.ndarray:
+        """Returns the totals from each day of boundaries to the next one (excluded)."""
+        boundaries = np.clip(boundaries, 0, self.days)
+        return self.sums[..., boundaries[1:]] - self.sums[..., boundaries[:-1]]
+
+    def window(self, start: int, stop: int) -> np.ndarray:
+        """Returns the totals from day start to day stop (excluded), which are 0 if stop is
+        not after start."""
+        return self.totals(np.array([start, max(start, stop)]))[..., 0]
+
+    def resample(self, period: int, epoch: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Returns the totals of consecutive periods of period days from day epoch (which may
+        be before the initial date) to day stop (by default, the end of the series). The
+        last period is kept even if it is not complete."""
+        return self.totals(period_boundaries(epoch, self.days if stop is None else stop,
+                                             period))
+
+    def monthly(self, initial_date: datetime.date, epoch: int = 0,
+                stop: Optional[int] = None) -> np.ndarray:
+        """Returns the totals of each calendar month from day epoch to day stop (by default,
+        the end of the series), when day 0 is initial_date. The first month starts on day
+        epoch."""
+        return self.totals(month_boundaries(initial_date, epoch,
+                                            self.days if stop is None else stop))
+
+    def rolling(self, width: int, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Returns the totals of the width days up to (and including) each day from day start
+        to day stop (by default, the end of the series)."""
+        ends = np.arange(start, self.days if stop is None else stop) + 1
+        return self.sums[..., np.clip(ends, 0, self.days)] \
+            - self.sums[..., np.clip(ends - width, 0, self.days)]
+
+
+def period_boundaries(start: int, stop: int, period: int) -> np.ndarray:
+    """Returns the first day of each period of period days from day start to day stop
+    (excluded), followed by stop.
+
+    >>> period_boundaries(0, 10, 4).tolist()
+    [0, 4, 8, 10]
+    """
+    return np.append(np.arange(start, stop, period), max(start, stop)).astype(np.int64)
+
+
+def month_boundaries(initial_date: datetime.date, start: int, stop: int) -> np.ndarray:
+    """Returns the first day of each calendar month from day start to day stop (excluded),
+    when day 0 is initial_date, followed by stop. The first month starts on day start.
+
+    >>> month_boundaries(datetime.date(2020, 3, 20), 0, 20).tolist()
+    [0, 12, 20]
+    """
+    if stop <= start:
+        return np.array([start], dtype=np.int64)
+    epoch = np.datetime64(initial_date, 'D')
+    months = np.arange((epoch + start).astype('datetime64[M]'),
+                       (epoch + stop - 1).astype('datetime64[M]') + 1)
+    boundaries = (months.astype('datetime64[D]') - epoch).astype(np.int64)
+    boundaries[0] = start
+    return np.append(boundaries, stop)
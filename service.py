@@ -0,0 +1,325 @@
+"""
+Local HTTP service querying the compiled series of every university.
+
+The series store saved by filter.save_series is loaded once and shared by every request,
+so that dashboards can query any university, window of dates and granularity (and have
+its charts rendered) without reading the datasets again. Responses are kept in a bounded
+least recently used cache, keyed on the request and the version of the store; the store
+is loaded again when its file changes, which also retires every cached response. A
+response requested by several dashboards at once is only computed once.
+
+    GET /universities
+        the names of the universities, the radii and the dates stored
+    GET /series?university=NAME[&radius=KM][&start=YYYY-MM-DD][&end=YYYY-MM-DD][&period=P]
+        the impact scores and COVID cases of the university in every period of P days
+        (by default 1), or calendar month if P is 'month', from start to end; or, given
+        &rolling=N, their averages over the N days up to every day from start to end
+    GET /chart?university=NAME&kind=impact|covid[&radius=...][&start=...][&end=...][&period=P]
+        the chart of the same series (weekly by default), as a draft PNG
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Hashable, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+
+import filter
+import visualisation
+from store import SeriesStore
+
+# Address the service listens on by default, only reachable from this computer
+HOST = '127.0.0.1'
+PORT = 8110
+
+# Number of responses (and rendered charts) kept in the cache
+CACHE_SIZE = 256
+
+# Series plotted by each kind of chart: (title, label of the y-axis, color)
+CHARTS = {'impact': ('impact scores', 'Impact score', 'b'),
+          'covid': ('related COVID-cases', 'COVID-cases', 'g')}
+
+# A response: its HTTP status, content type and body
+Response = tuple[int, str, bytes]
+
+
+class LRUCache:
+    """
+    A bounded mapping, safe to share between threads, which forgets its least recently
+    used entry when it is full.
+
+    Instance Attributes:
+        - capacity: the largest number of entries kept
+        - hits: the number of lookups that found their key
+        - misses: the number of lookups that did not
+
+    Representation Invariants:
+        - self.capacity >= 0
+        - len(self._entries) <= self.capacity
+    """
+    capacity: int
+    hits: int
+    misses: int
+    _entries: OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, capacity: int = CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value of key, or None if it is not cached."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache value as the value of key, forgetting the least recently used entries
+        beyond capacity."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SeriesService:
+    """
+    The responses to the queries of the service, computed from the series store at path.
+
+    Instance Attributes:
+        - path: the path of the series store
+        - cache: the cached responses, keyed on the store's version, route and parameters
+    """
+    path: str
+    cache: LRUCache
+    _store: Optional[SeriesStore]
+    _version: Optional[tuple[int, int]]
+    _load_lock: threading.Lock
+    _render_lock: threading.Lock
+    _pending: dict[Hashable, threading.Event]
+    _pending_lock: threading.Lock
+
+    def __init__(self, path: str = filter.SERIES_PATH, cache_size: int = CACHE_SIZE) -> None:
+        self.path = path
+        self.cache = LRUCache(cache_size)
+        self._store = None
+        self._version = None
+        self._load_lock = threading.Lock()
+        # matplotlib does not promise that figures can be rendered in several threads
+        self._render_lock = threading.Lock()
+        # Responses being computed, which concurrent requests for them wait for
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def data(self) -> tuple[SeriesStore, tuple[int, int]]:
+        """Return the series store and its version, its file's modification time and size,
+        loading it again if the file changed since it was last loaded."""
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._load_lock:
+            if version != self._version:
+                self._store = SeriesStore.load(self.path)
+                self._version = version
+            return self._store, self._version
+
+    def respond(self, route: str, params: dict[str, str]) -> tuple[Response, bool]:
+        """Return the response to route with the query parameters params, and whether it
+        was cached. Unknown routes are answered with 404, unknown universities or radii
+        with 404, invalid parameters with 400, and every query with 503 while there is no
+        store at self.path.
+
+        A response requested again while it is being computed is only computed once: the
+        other requests wait for it and are answered from the cache.
+        """
+        if route not in ROUTES:
+            return _error(404, f'no such route: {route}'), False
+
+        try:
+            data, version = self.data()
+        except OSError:
+            return _error(503, f'no series store at {self.path}, run main.py first'), False
+        key = (version, route, tuple(sorted(params.items())))
+
+        while True:
+            # The cache is checked with the pending responses locked, so that a response is
+            # always either cached or pending while it is being computed
+            with self._pending_lock:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached, True
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = threading.Event()
+                    break
+            # Errors are not cached, in which case the response is computed again
+            pending.wait()
+
+        try:
+            response = ROUTES[route](self, data, params)
+        except KeyError as error:
+            return _error(404, error.args[0] if error.args else str(error)), False
+        except ValueError as error:
+            return _error(400, str(error)), False
+        else:
+            self.cache.put(key, response)
+            return response, False
+        finally:
+            with self._pending_lock:
+                self._pending.pop(key).set()
+
+    def universities(self, data: SeriesStore, params: dict[str, str]) -> Response:
+        """Return the names of the universities, radii and dates of the store."""
+        return _json({'universities': data.names,
+                      'radii': data.radii.tolist(),
+                      'radius': data.radius,
+                      'initial_date': data.initial_date.isoformat(),
+                      'days': data.days})
+
+    def series(self, data: SeriesStore, params: dict[str, str]) -> Response:
+        """Return the impact scores and COVID cases of the university queried in params."""
+        dates, impact, cases = _query(data, params, default_period='1')
+        return _json({'university': params['university'],
+                      'radius': data.radius if 'radius' not in params else float(params['radius']),
+                      'period': params.get('period', '1'),
+                      'rolling': int(params['rolling']) if 'rolling' in params else None,
+                      'dates': [date.isoformat() for date in dates],
+                      'impact': impact.tolist(),
+                      'cases': cases.tolist()})
+
+    def chart(self, data: SeriesStore, params: dict[str, str]) -> Response:
+        """Return the chart of the kind of series, of the university, queried in params."""
+        kind = params.get('kind', 'impact')
+        if kind not in CHARTS:
+            raise ValueError(f'kind must be one of {", ".join(CHARTS)}')
+        title, ylabel, color = CHARTS[kind]
+
+        dates, impact, cases = _query(data, params, default_period='7')
+        y = impact if kind == 'impact' else cases
+        period = '1' if 'rolling' in params else params.get('period', '7')
+        unit = {'month': 'Months', '1': 'Days', '7': 'Weeks'}.get(period, f'{period}-day periods')
+        xlabel = f'{unit} since {dates[0].isoformat()}' if len(dates) else unit
+
+        with self._render_lock:
+            figure = visualisation.draw_chart(list(range(len(y))), y.tolist(),
+                                              f'{params["university"]} {title}', xlabel,
+                                              ylabel, color, xlim=None)
+            body = visualisation.chart_bytes(figure, draft=True)
+        return 200, f'image/{visualisation.DRAFT_FORMAT}', body
+
+
+# Method of SeriesService answering each route
+ROUTES = {'/universities': SeriesService.universities,
+          '/series': SeriesService.series,
+          '/chart': SeriesService.chart}
+
+
+def _query(data: SeriesStore, params: dict[str, str], default_period: str) -> tuple:
+    """Return data.query of the university, radius, start, end and period in params, or
+    data.rolling averages if params has a rolling width. Raise a ValueError if a parameter
+    is missing or invalid."""
+    if 'university' not in params:
+        raise ValueError('university is required')
+
+    radius = float(params['radius']) if 'radius' in params else None
+    if 'rolling' in params:
+        if not params['rolling'].isdigit() or int(params['rolling']) < 1:
+            raise ValueError('rolling must be a positive number of days')
+        return data.rolling(params['university'], int(params['rolling']), radius,
+                            params.get('start'), params.get('end'), mean=True)
+
+    period: Union[int, str] = params.get('period', default_period)
+    if period != 'month':
+        if not period.isdigit() or int(period) < 1:
+            raise ValueError("period must be a positive number of days or 'month'")
+        period = int(period)
+    return data.query(params['university'], radius, params.get('start'), params.get('end'),
+                      period)
+
+
+def _json(value: Any) -> Response:
+    """Return a response with value as JSON."""
+    return 200, 'application/json', json.dumps(value).encode('utf-8')
+
+
+def _error(status: int, message: str) -> Response:
+    """Return a response with status and message as JSON."""
+    return status, 'application/json', json.dumps({'error': message}).encode('utf-8')
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Answers the GET requests of a server made by make_server with its service."""
+
+    def do_GET(self) -> None:
+        """Send the response to the request, with an X-Cache header telling whether it
+        was cached."""
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        (status, content_type, body), cached = self.server.service.respond(url.path, params)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', 'hit' if cached else 'miss')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Do not log every request, which dashboards send many of."""
+
+
+def make_server(path: str = filter.SERIES_PATH, host: str = HOST, port: int = PORT,
+                cache_size: int = CACHE_SIZE) -> ThreadingHTTPServer:
+    """Return a server answering every request in a thread of its own with a SeriesService
+    of the store at path, listening on host and port (any free port if 0)."""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = SeriesService(path, cache_size)
+    server.service.data()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the compiled series over HTTP.')
+    parser.add_argument('--store', default=filter.SERIES_PATH,
+                        help='series store saved by main.py (default: %(default)s)')
+    parser.add_argument('--host', default=HOST, help='address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='port to listen on')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help='number of responses cached (default: %(default)s)')
+    args = parser.parse_args()
+
+    httpd = make_server(args.store, args.host, args.port, args.cache_size)
+    print(f'~ Serving {args.store} on http://{args.host}:{httpd.server_port}')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print('~ Stopped.')
+    finally:
+        httpd.server_close()
@@ -2,9 +2,9 @@
 Run this setup file to ensure twint is properly configured for tweets scraping
 without any limitations. The purpose of this file is to navigate the configuration files
 of your twint location and alter specific lines, known to bottleneck twint. In addition,
-'setup' of this program will ensure no datafiles exist within the Datasets directory to
-ensure old data isn't mixed with newly sourced data. If needed Ontario Dataset will be
-downloaded.
+the Ontario Dataset is downloaded if needed, or updated if it changed. start(clear=True)
+also empties the Datasets directory of scraped tweets, which main.py leaves in place so
+that they are only scraped incrementally.
 
 
 Copyright and Usage Information
@@ -21,6 +21,7 @@ This file is Copyright (c) 2021:
     Hyun Bin Antonio Kim
     Minh Ngoc Le
 """
+import json
 import platform
 import site
 import os
@@ -35,11 +36,19 @@ token_config = {
     'AMD64': '(Windows NT 10.0; Win64; x64; rv:78.0)'
 }
 
+COVID_DATA_URL = 'https://data.ontario.ca/dataset/f4112442-bdc8-45d2-be3c-12efae72fb27' \
+                 '/resource/455fd63b-603d-4608-8216-7d8647f43350/download/conposcovidloc.csv'
+COVID_DATA_FILE = 'Ontario_Covid_Dataset.csv'
 
-def start() -> None:
+# seconds to wait for the Ontario Data Catalogue to respond, and bytes written at a time
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+
+def start(clear: bool = True) -> None:
     """
-    Edit configuration file to ensure no errors/limitations are called during data-scraping. Empty
-    Datasets directory to ensure only newly sourced data is stored. Return None.
+    Edit configuration file to ensure no errors/limitations are called during data-scraping. If
+    clear, empty Datasets directory to ensure only newly sourced data is stored. Return None.
     """
 
     # identify hardware type
@@ -53,7 +62,8 @@ def start() -> None:
     configure_url()
 
     # empty Datasets directory
-    clear_data_directory()
+    if clear:
+        clear_data_directory()
 
     # Check Covid-19 data
     download_covid_data()
@@ -114,36 +124,192 @@ def configure_url() -> None:
 
 def clear_data_directory() -> None:
     """
-    Locate Datasets directory and  delete any existent files. Return None.
+    Locate Datasets directory and  delete any existent files. Sub-directories (such as
+    the cache of the Ontario dataset) and the Ontario dataset itself, along with its
+    download state, are kept. Return None.
     """
 
     files = os.listdir('Datasets')
 
     for file in files:
-        if file != '.DS_Store':
+        if file != '.DS_Store' and not file.startswith(COVID_DATA_FILE) \
+                and (Path('Datasets') / file).is_file():
             os.remove(Path('Datasets') / file)
 
     # print success notification
     print('~ Datasets Cleared!')
 
 
-def download_covid_data() -> None:
+def download_covid_data(url: str = COVID_DATA_URL, dir: str = 'Datasets') -> None:
     """
-    If ontario Covid-19 data not found download data from the Ontario
-    Data Catalogue. Return None.
+    Download the ontario Covid-19 data from the Ontario Data Catalogue, unless the copy
+    within dir is already up to date. Return None.
+
+    The dataset is streamed into a '.part' file which only replaces the dataset once it
+    is complete. An interrupted download is resumed with an HTTP Range request on the next
+    call, and an existing dataset is revalidated with its ETag/Last-Modified validators, so
+    an unchanged dataset is never downloaded again. A dataset without stored validators
+    is only kept if a HEAD request reports its size, and then has them stored; otherwise
+    it may be truncated or outdated, and is downloaded again.
+    Whenever the Ontario Data Catalogue cannot be used, an existing dataset is kept.
     """
 
-    dir = 'Datasets'
-    files = os.listdir(dir)
-    url = 'https://data.ontario.ca/dataset/f4112442-bdc8-45d2-be3c-12efae72fb27' \
-          '/resource/455fd63b-603d-4608-8216-7d8647f43350/download/conposcovidloc.csv'
+    path = Path(dir) / COVID_DATA_FILE
+    try:
+        _download_covid_data(url, path)
+    except requests.RequestException as error:
+        if not path.exists():
+            raise
+        print(f'! Could not update the Covid-19 Dataset ({error}), using the one already '
+              'downloaded')
+
+
+def _download_covid_data(url: str, path: Path) -> None:
+    """
+    Download the dataset at url into path as download_covid_data describes, raising any
+    requests.RequestException. Return None.
+    """
+
+    partial = path.with_name(path.name + '.part')
+    validators_path = path.with_name(path.name + '.http.json')
+    partial_validators_path = partial.with_name(partial.name + '.http.json')
+
+    if path.exists() and not partial.exists() and not read_validators(validators_path):
+        # without validators, the dataset is only known to be current if it has the size
+        # the server reports, which an interrupted download would not
+        response = requests.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        if content_length(response) == path.stat().st_size:
+            write_validators(validators_path, response)
+            print('~ Covid-19 Dataset Detected!')
+            return
+        print('! Covid-19 Dataset is incomplete or outdated')
+
+    # a partial file whose download cannot be resumed is downloaded again from scratch
+    for resume in (True, False):
+        headers = {}
+        resume_from = 0
+        if resume and partial.exists() and partial_validators_path.exists():
+            # resume the interrupted download, as long as the dataset has not changed since
+            resume_from = partial.stat().st_size
+            validators = read_validators(partial_validators_path)
+            headers['Range'] = f'bytes={resume_from}-'
+            if 'etag' in validators or 'last_modified' in validators:
+                headers['If-Range'] = validators.get('etag', validators.get('last_modified'))
+        elif path.exists():
+            # only download the dataset again if it has changed (always, without validators)
+            validators = read_validators(validators_path)
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'last_modified' in validators:
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        with requests.get(url, headers=headers, stream=True, allow_redirects=True,
+                          timeout=DOWNLOAD_TIMEOUT) as response:
+            if response.status_code == 304:
+                print('~ Covid-19 Dataset Detected!')
+                return
+
+            if resume_from and response.status_code == 416:
+                if content_range_total(response) == resume_from:
+                    # the partial file already holds the whole dataset
+                    break
+                _discard(partial, partial_validators_path)
+                continue
+            if resume_from and response.status_code == 206 \
+                    and content_range_start(response) != resume_from:
+                # the server did not resume where the partial file ends
+                _discard(partial, partial_validators_path)
+                continue
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                print('~ Resuming Covid-19 Dataset download')
+                mode = 'ab'
+            else:
+                print('~ Downloading Covid-19 Dataset')
+                mode = 'wb'
+
+            # remember which version of the dataset the partial file belongs to
+            write_validators(partial_validators_path, response)
+
+            with open(partial, mode) as file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    file.write(chunk)
+            break
+
+    os.replace(partial, path)
+    os.replace(partial_validators_path, validators_path)
+
+    print('~ Covid-19 Dataset Downloaded!')
+
+
+def _discard(*paths: Path) -> None:
+    """
+    Delete the files at paths that exist. Return None.
+    """
 
-    if 'Ontario_Covid_Dataset.csv' not in files:
-        print('~ Downloading Covid-19 Dataset')
+    for path in paths:
+        if path.exists():
+            os.remove(path)
+
+
+def content_range_start(response: requests.Response) -> int:
+    """
+    Return the first byte position of the given partial content response, or -1 if it
+    has no usable Content-Range header.
+    """
+
+    content_range = response.headers.get('Content-Range', '')
+    if not content_range.startswith('bytes ') or '-' not in content_range:
+        return -1
+    start = content_range[len('bytes '):].split('-', 1)[0]
+    return int(start) if start.isdigit() else -1
+
+
+def content_range_total(response: requests.Response) -> int:
+    """
+    Return the complete length given by the Content-Range header of the response (such
+    as 'bytes */1234' of a 416 response), or -1 if it has none.
+    """
+
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else -1
+
+
+def content_length(response: requests.Response) -> int:
+    """
+    Return the length given by the Content-Length header of the response, or -1 if it
+    has none.
+    """
+
+    length = response.headers.get('Content-Length', '')
+    return int(length) if length.isdigit() else -1
+
+
+def read_validators(path: Path) -> dict[str, str]:
+    """
+    Return the HTTP validators (ETag and Last-Modified) stored at path, or an empty
+    dictionary if there are none.
+    """
+
+    if not path.exists():
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_validators(path: Path, response: requests.Response) -> None:
+    """
+    Store the HTTP validators (ETag and Last-Modified) of the given response at path.
+    Return None.
+    """
 
-        data = requests.get(url, allow_redirects=True)
-        open(Path(dir) / 'Ontario_Covid_Dataset.csv', 'wb').write(data.content)
+    validators = {}
+    if 'ETag' in response.headers:
+        validators['etag'] = response.headers['ETag']
+    if 'Last-Modified' in response.headers:
+        validators['last_modified'] = response.headers['Last-Modified']
 
-        print('~ Covid-19 Dataset Downloaded!')
-    else:
-        print('~ Covid-19 Dataset Detected!')
+    with open(path, 'w') as file:
+        json.dump(validators, file)
@@ -0,0 +1,247 @@
+"""
+Columnar on-disk store of the compiled daily series of every university.
+
+The store holds one row per (university, radius, day) with a non-zero impact score or
+number of COVID cases, sorted by university, radius and day, in NumPy columns saved as an
+.npz file, which stays small as most days of most series are 0. The rows of each
+(university, radius) series are contiguous.
+
+Queries are answered from the cumulative sums of every series, computed once when first
+needed, so that any window of days is resampled to days, weeks (or any period), calendar
+months or rolling windows without reading the raw datasets, each total being a single
+difference.
+
+Copyright and Usage Information
+===============================
+This file is provided solely for the personal and private use of evaluators
+of CSC110 at the University of Toronto St. George campus. All forms of
+distribution of this code, whether as given or with any changes, are
+expressly prohibited.
+
+This file is Copyright (c) 2021:
+    Kurtis Law
+    Shaan Purewal
+    Hyun Bin Antonio Kim
+    Minh Ngoc Le
+
+"""
+import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from fileio import atomic_write
+from series import DailySeries, PrefixSums, month_boundaries, period_boundaries
+
+# A date, as a datetime.date or in a YYYY-MM-DD format
+Date = Union[datetime.date, str]
+
+
+class SeriesStore:
+    """
+    The daily impact scores and COVID cases (within each radius) of universities.
+
+    Instance Attributes:
+        - names: the display name of each university
+        - radii: the radii (in km) COVID cases were counted within, in increasing order
+        - radius: the radius queried when none is given
+        - initial_date: the date of day 0
+        - days: the number of days since initial_date covered by the store
+
+    Representation Invariants:
+        - len(set(self.names)) == len(self.names)
+        - self.radius in self.radii
+        - all(self.radii[i] < self.radii[i + 1] for i in range(len(self.radii) - 1))
+
+    >>> store = SeriesStore(['U of T'], [5.0], datetime.date(2020, 3, 20),
+    ...                     [DailySeries.from_days([0, 1, 8], [3, 1, 2])],
+    ...                     [[DailySeries.from_days([1, 1, 9])]])
+    >>> dates, impact, cases = store.query('U of T', period=7)
+    >>> dates.tolist(), impact.tolist(), cases.tolist()
+    ([datetime.date(2020, 3, 20), datetime.date(2020, 3, 27)], [4, 2], [2, 1])
+    >>> store.query('U of T', start='2020-03-21', end='2020-03-28')[2].tolist()
+    [2, 0, 0, 0, 0, 0, 0, 0]
+    """
+    names: list[str]
+    radii: np.ndarray
+    radius: float
+    initial_date: datetime.date
+    days: int
+    _offsets: np.ndarray
+    _day: np.ndarray
+    _impact: np.ndarray
+    _cases: np.ndarray
+    _prefix_sums: Optional[PrefixSums]
+
+    def __init__(self, names: list[str], radii: list[float], initial_date: datetime.date,
+                 impacts: list[DailySeries], cases: list[list[DailySeries]],
+                 radius: Optional[float] = None) -> None:
+        """Initialize the store of the daily impacts[u] and the daily cases[u][r] within
+        radii[r] of the university called names[u]. radius defaults to the first radius."""
+        self.names = list(names)
+        self.radii = np.asarray(radii, dtype=float)
+        self.radius = float(self.radii[0] if radius is None else radius)
+        self.initial_date = initial_date
+        self._prefix_sums = None
+
+        # Each (university, radius) series is stored as the rows of its non-zero days
+        columns = ([], [], [])
+        offsets = [0]
+        self.days = 0
+        for impact, uni_cases in zip(impacts, cases):
+            for radius_cases in uni_cases:
+                length = max(len(impact), len(radius_cases))
+                self.days = max(self.days, length)
+                impact_counts = _padded(impact.counts, length)
+                case_counts = _padded(radius_cases.counts, length)
+                day = np.flatnonzero(impact_counts | case_counts)
+                for column, values in zip(columns, (day, impact_counts[day], case_counts[day])):
+                    column.append(values)
+                offsets.append(offsets[-1] + len(day))
+
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._day, self._impact, self._cases = (
+            np.concatenate(column) if column else np.zeros(0, dtype=np.int64)
+            for column in columns)
+
+    def save(self, path: str) -> None:
+        """Atomically store this store at path as an .npz file."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        # np.savez adds '.npz' to paths without it, so write through a file object
+        with atomic_write(path, 'wb') as file:
+            np.savez(file, names=np.array(self.names), radii=self.radii,
+                     radius=np.float64(self.radius),
+                     initial_date=np.datetime64(self.initial_date, 'D'),
+                     days=np.int64(self.days), offsets=self._offsets, day=self._day,
+                     impact=self._impact, cases=self._cases)
+
+    @classmethod
+    def load(cls, path: str) -> 'SeriesStore':
+        """Return the store saved at path."""
+        store = cls.__new__(cls)
+        with np.load(path) as stored:
+            store.names = stored['names'].tolist()
+            store.radii = stored['radii']
+            store.radius = float(stored['radius'])
+            store.initial_date = stored['initial_date'].item()
+            store.days = int(stored['days'])
+            store._offsets = stored['offsets']
+            store._day = stored['day']
+            store._impact = stored['impact']
+            store._cases = stored['cases']
+        store._prefix_sums = None
+        return store
+
+    def series(self, name: str, radius: Optional[float] = None) \
+            -> tuple[DailySeries, DailySeries]:
+        """Return the whole daily impact scores of the university called name, and its daily
+        COVID cases within radius (by default, self.radius), up to their last non-zero day."""
+        _, impact, cases = self.query(name, radius)
+        return DailySeries(np.trim_zeros(impact, 'b')), DailySeries(np.trim_zeros(cases, 'b'))
+
+    def query(self, name: str, radius: Optional[float] = None, start: Optional[Date] = None,
+              end: Optional[Date] = None, period: Union[int, str] = 1) \
+            -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the first date of each period from start up to end (both included), and
+        the impact score and COVID cases within radius of the university called name in
+        each period.
+
+        start defaults to initial_date and end to the last day of the store. period is a
+        number of days, or 'month' for calendar months; the last period may be incomplete.
+        radius defaults to self.radius. Raise a KeyError if the university or radius is not
+        stored, and a ValueError if period is neither a positive number of days nor 'month'.
+
+        >>> store = SeriesStore(['U of T'], [5.0], datetime.date(2020, 3, 20),
+        ...                     [DailySeries()], [[DailySeries()]])
+        >>> store.query('U of T', period=0)
+        Traceback (most recent call last):
+        ValueError: period must be a positive number of days or 'month', not 0
+        """
+        if period != 'month' and not (isinstance(period, (int, np.integer))
+                                      and not isinstance(period, bool) and period >= 1):
+            raise ValueError(f"period must be a positive number of days or 'month', "
+                             f"not {period!r}")
+        series = self._series_index(name, radius)
+        first, stop = self._day_range(start, end)
+        if period == 'month':
+            boundaries = month_boundaries(self.initial_date, first, stop)
+        else:
+            boundaries = period_boundaries(first, stop, int(period))
+
+        impact_totals, case_totals = self._cumulative()[series].totals(boundaries)
+        dates = np.datetime64(self.initial_date, 'D') + boundaries[:-1]
+        return dates.astype(datetime.date), impact_totals, case_totals
+
+    def rolling(self, name: str, width: int, radius: Optional[float] = None,
+                start: Optional[Date] = None, end: Optional[Date] = None,
+                mean: bool = False) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return every date from start up to end (both included), and the impact score
+        and COVID cases within radius of the university called name in the width days up
+        to each date, or their daily averages if mean. The windows of the first dates reach
+        back before start.
+
+        start, end and radius default as for query. Raise a KeyError if the university or
+        radius is not stored, and a ValueError if width is not a positive number of days.
+
+        >>> store = SeriesStore(['U of T'], [5.0], datetime.date(2020, 3, 20),
+        ...                     [DailySeries(np.arange(6))], [[DailySeries()]])
+        >>> store.rolling('U of T', 3, start='2020-03-22', mean=True)[1].tolist()
+        [1.0, 2.0, 3.0, 4.0]
+        """
+        if not (isinstance(width, (int, np.integer)) and not isinstance(width, bool)
+                and width >= 1):
+            raise ValueError(f'width must be a positive number of days, not {width!r}')
+        series = self._series_index(name, radius)
+        first, stop = self._day_range(start, end)
+        impact, cases = self._cumulative()[series].rolling(width, first, stop)
+        dates = np.datetime64(self.initial_date, 'D') + np.arange(first, max(first, stop))
+        if mean:
+            return dates.astype(datetime.date), impact / width, cases / width
+        return dates.astype(datetime.date), impact, cases
+
+    def _cumulative(self) -> PrefixSums:
+        """Return the cumulative sums of the daily impact scores and COVID cases of every
+        series, indexed by series and then 0 (impact scores) or 1 (COVID cases)."""
+        if self._prefix_sums is None:
+            # Scatter the stored rows into dense daily columns of every series at once
+            series = np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))
+            flat = series * self.days + self._day
+            size = (len(self._offsets) - 1) * self.days
+            counts = np.stack([np.bincount(flat, self._impact, size),
+                               np.bincount(flat, self._cases, size)])
+            self._prefix_sums = PrefixSums(
+                counts.reshape(2, len(self._offsets) - 1, self.days).transpose(1, 0, 2))
+        return self._prefix_sums
+
+    def _day_range(self, start: Optional[Date], end: Optional[Date]) -> tuple[int, int]:
+        """Return the day of start (by default, 0) and the day after end (by default, the
+        last day of the store)."""
+        first = 0 if start is None else self._day_offset(start)
+        last = self.days - 1 if end is None else self._day_offset(end)
+        return first, last + 1
+
+    def _series_index(self, name: str, radius: Optional[float]) -> int:
+        """Return the index of the series of the university called name within radius."""
+        if radius is None:
+            radius = self.radius
+        matches = np.flatnonzero(np.isclose(self.radii, radius))
+        if len(matches) == 0:
+            raise KeyError(f'no COVID cases within {radius} km are stored')
+        radius_index = int(matches[0])
+
+        if name not in self.names:
+            raise KeyError(f'{name} is not stored')
+        return self.names.index(name) * len(self.radii) + radius_index
+
+    def _day_offset(self, date: Date) -> int:
+        """Return the number of days since initial_date of date."""
+        if isinstance(date, str):
+            date = datetime.date.fromisoformat(date)
+        return (date - self.initial_date).days
+
+
+def _padded(counts: np.ndarray, length: int) -> np.ndarray:
+    """Return counts padded with zeros up to length."""
+    return np.pad(counts, (0, length - len(counts)))
@@ -0,0 +1,8 @@
+"""
+Shared configuration of the tests: the modules of the repository are imported from its
+root, as main.py imports them.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
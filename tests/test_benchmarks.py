@@ -0,0 +1,27 @@
+"""
+Tests that the benchmark suite runs on tiny synthetic datasets.
+"""
+from pathlib import Path
+
+import filter
+from benchmarks import bench_pipeline, synthetic
+
+
+def test_synthetic_datasets_are_read_like_the_real_ones(tmp_path) -> None:
+    synthetic.write_ontario_csv(str(tmp_path / 'ontario.csv'), 500)
+    synthetic.write_tweets_csv(str(tmp_path / 'tweets.csv'), 50)
+    assert sum(len(days) for days, _, _ in filter.read_covid_chunks(
+        str(tmp_path / 'ontario.csv'), chunk_size=128)) == 500
+
+    uni = filter.University('Synthetic', {}, {}, filter.uni_list[0].location,
+                            str(tmp_path / 'tweets.csv'))
+    assert filter.creating_impact_series(uni).counts.sum() > 0
+
+
+def test_every_benchmark_runs(monkeypatch, capsys) -> None:
+    monkeypatch.chdir(Path(bench_pipeline.__file__).parent.parent)
+    results = bench_pipeline.run_suite([200], list(bench_pipeline.BENCHMARKS))
+    assert [result['benchmark'] for result in results] == list(bench_pipeline.BENCHMARKS)
+    assert all(result['size'] == 200 and result['rows'] > 0 for result in results)
+    table = capsys.readouterr().out
+    assert all(name in table for name in bench_pipeline.BENCHMARKS)
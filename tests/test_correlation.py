@@ -0,0 +1,66 @@
+"""
+Tests of correlation.cross_correlations against correlating every lag directly.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import correlation
+from series import DailySeries
+
+
+def direct_correlation(impacts: np.ndarray, cases: np.ndarray, lag: int) -> float:
+    """Return the sample cross-correlation of impacts with cases lag weeks later, both
+    padded with zeros to the same length."""
+    length = max(len(impacts), len(cases))
+    impacts = np.pad(np.asarray(impacts, dtype=float), (0, length - len(impacts)))
+    cases = np.pad(np.asarray(cases, dtype=float), (0, length - len(cases)))
+    if impacts.std() == 0 or cases.std() == 0:
+        return np.nan
+    impacts = (impacts - impacts.mean()) / impacts.std()
+    cases = (cases - cases.mean()) / cases.std()
+    return sum(impacts[week] * cases[week + lag] for week in range(length)
+               if 0 <= week + lag < length) / length
+
+
+@pytest.mark.parametrize('seed, max_lag', [(0, 12), (1, 3), (2, 40)])
+def test_correlations_match_direct_sums(seed, max_lag) -> None:
+    rng = np.random.default_rng(seed)
+    impacts = rng.integers(0, 9, (4, 30))
+    cases = rng.poisson(5, (4, 3, 26))
+    lags, correlations = correlation.cross_correlations(impacts[:, np.newaxis], cases, max_lag)
+
+    assert lags.tolist() == list(range(-min(max_lag, 29), min(max_lag, 29) + 1))
+    for u in range(4):
+        for r in range(3):
+            expected = [direct_correlation(impacts[u], cases[u, r], lag) for lag in lags]
+            assert correlations[u, r] == pytest.approx(expected)
+
+
+def test_constant_series_have_no_correlation() -> None:
+    lags, correlations = correlation.cross_correlations(np.ones(10), np.arange(10), 2)
+    assert np.isnan(correlations).all()
+    assert correlation.best_lags(lags, correlations)[0] == 0
+
+
+def test_universities_are_correlated_at_every_radius() -> None:
+    rng = np.random.default_rng(17)
+    unis = []
+    for name in ('U of T', 'Queens'):
+        impacts = rng.integers(0, 4, 200)
+        sweep = {radius: DailySeries(np.roll(impacts, 7 * weeks) * rng.integers(1, 3, 200))
+                 for radius, weeks in ((1.0, 2), (5.0, 4))}
+        unis.append(SimpleNamespace(display_name=name, impact_series=DailySeries(impacts),
+                                    covid_sweep=sweep))
+
+    results = correlation.correlate_universities(unis, max_lag=8)
+    assert [(result['university'], result['radius_km']) for result in results] \
+        == [('U of T', 1.0), ('U of T', 5.0), ('Queens', 1.0), ('Queens', 5.0)]
+    for result, uni in zip(results, [unis[0], unis[0], unis[1], unis[1]]):
+        weekly_impacts = uni.impact_series.weekly()
+        weekly_cases = uni.covid_sweep[result['radius_km']].weekly()
+        expected = [direct_correlation(weekly_impacts, weekly_cases, lag)
+                    for lag in range(-8, 9)]
+        assert result['lag_weeks'] == int(np.argmax(np.abs(expected))) - 8
+        assert result['coefficient'] == round(expected[result['lag_weeks'] + 8], 4)
@@ -0,0 +1,113 @@
+"""
+Tests of dedup.deduplicate against keeping the first row of every tweet key in a set.
+"""
+import csv
+import os
+
+import numpy as np
+import pytest
+
+import dedup
+
+HEADER = ['id', 'date', 'tweet']
+
+
+def random_rows(rng: np.random.Generator, count: int) -> list[list[str]]:
+    """Return count tweet rows drawn from a small pool, so that many are repeated, some of
+    them without an id."""
+    rows = []
+    for number in rng.integers(0, 60, count).tolist():
+        tweet_id = '' if number % 10 == 0 else str(1350000000000000000 + number)
+        rows.append([tweet_id, f'2021-01-{number % 28 + 1:02}', f'covid update {number}'])
+    return rows
+
+
+def append_rows(path, rows: list[list[str]]) -> None:
+    """Append rows to the dataset at path, starting it with HEADER if it does not exist."""
+    is_new = not path.exists()
+    with open(path, 'a', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        if is_new:
+            writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def first_occurrences(path) -> list[list[str]]:
+    """Return the header of the dataset at path and the first row of each of its tweets."""
+    with open(path, encoding='utf-8', newline='') as file:
+        header, *rows = [row for row in csv.reader(file) if row]
+    seen = set()
+    kept = [header]
+    for row in rows:
+        if dedup.tweet_key(row) not in seen:
+            seen.add(dedup.tweet_key(row))
+            kept.append(row)
+    return kept
+
+
+def read_rows(path) -> list[list[str]]:
+    """Return the rows of the dataset at path."""
+    with open(path, encoding='utf-8', newline='') as file:
+        return [row for row in csv.reader(file) if row]
+
+
+@pytest.fixture
+def paths(tmp_path) -> tuple:
+    return tmp_path / 'covid.csv', str(tmp_path / 'deduplicated' / 'covid.csv')
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_appends_match_first_occurrences(paths, seed) -> None:
+    path, output = paths
+    rng = np.random.default_rng(seed)
+    for count in (40, 1, 0, 25, 70):
+        rows = random_rows(rng, count)
+        append_rows(path, rows)
+        copied = read_rows(output) if os.path.exists(output) else [HEADER]
+        expected = first_occurrences(path)
+
+        added = len(expected) - len(copied)
+        assert dedup.deduplicate(str(path), output) == (count, count - added)
+        assert read_rows(output) == expected
+    assert dedup.deduplicate(str(path), output) == (0, 0)
+
+
+def test_rows_without_ids_are_keyed_by_their_contents(paths) -> None:
+    path, output = paths
+    append_rows(path, [['', '2021-01-01', 'a'], ['', '2021-01-01', 'a'],
+                       ['', '2021-01-01', 'b'], ['x1', '2021-01-01', 'a']])
+    assert dedup.deduplicate(str(path), output) == (4, 2)
+    assert read_rows(output)[1:] == [['', '2021-01-01', 'a'], ['', '2021-01-01', 'b']]
+
+
+def test_rewritten_datasets_are_copied_again(paths) -> None:
+    path, output = paths
+    rng = np.random.default_rng(24)
+    append_rows(path, random_rows(rng, 50))
+    dedup.deduplicate(str(path), output)
+
+    # Scraping again from scratch replaces the dataset, keeping neither its rows nor size
+    path.unlink()
+    rows = random_rows(rng, 80)
+    append_rows(path, rows)
+    assert dedup.deduplicate(str(path), output)[0] == 80
+    assert read_rows(output) == first_occurrences(path)
+
+
+def test_rows_written_after_the_index_are_dropped(paths) -> None:
+    path, output = paths
+    rng = np.random.default_rng(7)
+    append_rows(path, random_rows(rng, 30))
+    dedup.deduplicate(str(path), output)
+
+    # As if a run was interrupted after writing its rows, but before saving the index
+    with open(output, 'a', encoding='utf-8', newline='') as file:
+        csv.writer(file).writerow(['1350000000000000099', '2021-01-01', 'lost'])
+    append_rows(path, random_rows(rng, 30))
+    dedup.deduplicate(str(path), output)
+    assert read_rows(output) == first_occurrences(path)
+
+    with np.load(dedup.index_path(output)) as index:
+        assert index['seen'].tolist() == sorted(dedup.tweet_key(row)
+                                                for row in read_rows(output)[1:])
+        assert int(index['offset']) == path.stat().st_size
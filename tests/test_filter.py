@@ -0,0 +1,333 @@
+"""
+Tests of filter's reading and counting of the Ontario COVID dataset, and scoring of
+tweets, against the scalar implementations they replaced.
+"""
+import csv
+import datetime
+import math
+
+import numpy as np
+import pytest
+
+import filter
+from series import DailySeries
+
+HEADER = ['Row_ID', 'Accurate_Episode_Date'] + [f'column {i}' for i in range(2, 16)] \
+    + ['Reporting_PHU_Latitude', 'Reporting_PHU_Longitude']
+
+
+def random_cases(seed: int, count: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the latitudes and longitudes of count cases scattered up to about 40 km
+    around the campuses of filter.uni_list, as float32 like the cached columns."""
+    rng = np.random.default_rng(seed)
+    centres = np.array([uni.location for uni in filter.uni_list])[rng.integers(
+        0, len(filter.uni_list), count)]
+    offsets = rng.normal(scale=0.15, size=(count, 2))
+    cases = (centres + offsets).astype(np.float32)
+    return cases[:, 0], cases[:, 1]
+
+
+def write_cases(path, cases: list[tuple[str, str, str]]) -> None:
+    """Write an Ontario dataset at path of the (date, latitude, longitude) cases."""
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        for row_id, (date, latitude, longitude) in enumerate(cases):
+            writer.writerow([str(row_id), date] + [''] * 14 + [latitude, longitude])
+
+
+def case_rows(seed: int, count: int) -> list[tuple[str, str, str]]:
+    """Return count (date, latitude, longitude) cases of random_cases, dated from before
+    INITIAL_DATE to a year after it, some of them without coordinates."""
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes = random_cases(seed, count)
+    days = rng.integers(-40, 400, count)
+    rows = [((filter.INITIAL_DATE + datetime.timedelta(days=int(day))).isoformat(),
+             repr(float(latitude)), repr(float(longitude)))
+            for day, latitude, longitude in zip(days, latitudes, longitudes)]
+    for i in rng.choice(count, count // 50, replace=False):
+        rows[i] = (rows[i][0], '', '')
+    return rows
+
+
+def scalar_counts(path, location: tuple[float, float], radius: float) -> DailySeries:
+    """Return the daily cases within radius of location in the Ontario dataset at path,
+    read row by row and checked with the scalar haversine, as the original code did."""
+    days = []
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if row[1] == 'Accurate_Episode_Date' or row[16] == '':
+                continue
+            day = (datetime.date.fromisoformat(row[1]) - filter.INITIAL_DATE).days
+            if day >= 0 and filter.within_range(float(row[16]), float(row[17]),
+                                                location[0], location[1], radius):
+                days.append(day)
+    return DailySeries.from_days(days)
+
+
+@pytest.fixture
+def ontario(tmp_path, monkeypatch):
+    """Point filter at an Ontario dataset (and its caches) in tmp_path, counted in small
+    chunks, and return the dataset's path."""
+    path = tmp_path / 'Ontario_Covid_Dataset.csv'
+    monkeypatch.setattr(filter, 'COVID_CSV_PATH', str(path))
+    monkeypatch.setattr(filter, 'COVID_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(filter, 'COVID_COUNTS_PATH', str(tmp_path / 'cache' / 'counts.json'))
+    monkeypatch.setattr(filter, 'CHUNK_SIZE', 97)
+    write_cases(path, case_rows(1, 2000))
+    return path
+
+
+def test_unparsable_coordinates_are_read_as_nan(tmp_path) -> None:
+    path = tmp_path / 'cases.csv'
+    write_cases(path, [('2020-03-01', '', ''), ('2020-03-02', 'n/a', '-79.4'),
+                       ('2020-03-21', '43.66', '-79.39'), ('2020-03-22', '43.7', '')])
+
+    [(days, latitudes, longitudes)] = filter.read_covid_chunks(str(path))
+    assert days.tolist() == [-19, -18, 1, 2]
+    assert latitudes[2] == 43.66 and longitudes[2] == -79.39
+    assert all(math.isnan(latitudes[i]) and math.isnan(longitudes[i]) for i in (0, 1, 3))
+
+
+def test_cases_without_coordinates_are_not_counted(tmp_path) -> None:
+    path = tmp_path / 'cases.csv'
+    write_cases(path, [('2020-02-01', 'bad', 'bad'), ('2020-03-21', '43.66', '-79.39'),
+                       ('2020-03-22', '', '')])
+
+    grid = filter.CaseGrid(*next(filter.read_covid_chunks(str(path)))[1:])
+    assert grid.query(43.664486, -79.399689, filter.RADIUS).tolist() == [1]
+    assert np.isnan(grid.latitudes).sum() == 2
+
+
+def test_impact_scores_match_checking_every_keyword() -> None:
+    tweets = ['Please stay safe during COVID-19, keep social distancing!',
+              'covid vaccine clinic on campus, wear a mask', 'COVID update: nothing new', '']
+    for tweet in tweets:
+        expected = sum(weight for keyword, weight in filter.KEYWORDS_LIST.items()
+                       if keyword in tweet)
+        assert filter.calculate_impact_score(tweet, '[]') == expected
+        assert filter.KEYWORDS_MATCHER.score(tweet) == expected
+
+
+def test_default_matcher_is_built_once(monkeypatch) -> None:
+    def fail(*args) -> None:
+        raise AssertionError('a matcher was built')
+
+    monkeypatch.setattr(filter.KeywordMatcher, '__init__', fail)
+    assert filter.calculate_impact_score('Practice social distancing', '[]') == 11
+
+
+def test_haversine_matrix_matches_haversine() -> None:
+    latitudes, longitudes = random_cases(2, 300)
+    locations = np.array([uni.location for uni in filter.uni_list])
+
+    distances = filter.haversine_matrix(latitudes, longitudes, locations)
+    mask = filter.within_range_mask(latitudes, longitudes, locations, filter.RADIUS)
+    for i, (latitude, longitude) in enumerate(zip(latitudes.tolist(), longitudes.tolist())):
+        for j, location in enumerate(locations.tolist()):
+            expected = filter.haversine(latitude, longitude, location[0], location[1])
+            assert distances[i, j] == pytest.approx(expected, rel=1e-9, abs=1e-9)
+            assert mask[i, j] == filter.within_range(latitude, longitude, location[0],
+                                                     location[1], filter.RADIUS)
+
+
+@pytest.mark.parametrize('cell_km, radius', [(filter.RADIUS, filter.RADIUS), (25, 1),
+                                             (25, 10), (2, 5)])
+def test_grid_queries_match_checking_every_case(cell_km, radius) -> None:
+    latitudes, longitudes = random_cases(3, 3000)
+    grid = filter.CaseGrid(latitudes, longitudes, cell_km)
+
+    locations = [uni.location for uni in filter.uni_list] + [(0.0, 0.0), (60.0, -100.0)]
+    for latitude, longitude in locations:
+        expected = [i for i, case in enumerate(zip(latitudes.tolist(), longitudes.tolist()))
+                    if filter.within_range(case[0], case[1], latitude, longitude, radius)]
+        assert grid.query(latitude, longitude, radius).tolist() == expected
+
+
+def test_single_pass_counts_match_counting_each_university(ontario) -> None:
+    counted = filter.creating_covid_series(filter.uni_list)
+    for uni, series in zip(filter.uni_list, counted):
+        expected = scalar_counts(ontario, uni.location, filter.RADIUS)
+        assert series == expected and expected.counts.sum() > 0
+
+
+def assert_cache_matches(ontario) -> None:
+    """Assert that the columns cached of the dataset at ontario, loaded (and cached) anew,
+    are those parsed without any cache."""
+    chunks = list(filter.read_covid_chunks(str(ontario)))
+    for index, (column, dtype) in enumerate(zip(
+            filter.load_covid_columns(str(ontario), filter.COVID_CACHE_DIR),
+            (np.int16, np.float32, np.float32))):
+        assert column.dtype == dtype
+        np.testing.assert_array_equal(
+            column, np.concatenate([chunk[index] for chunk in chunks]).astype(dtype))
+
+
+def test_column_cache_follows_the_dataset(ontario, monkeypatch) -> None:
+    parses = []
+    parse = filter._parse_covid_columns
+    monkeypatch.setattr(filter, '_parse_covid_columns',
+                        lambda *args: parses.append(args[1:]) or parse(*args))
+    assert_cache_matches(ontario)
+
+    # an unchanged (even if touched) dataset is not parsed again
+    ontario.touch()
+    assert_cache_matches(ontario)
+    assert len(parses) == 1
+
+    # appended rows are the only ones parsed
+    size = ontario.stat().st_size
+    write_cases(ontario, case_rows(1, 2000) + case_rows(5, 300))
+    assert_cache_matches(ontario)
+    assert parses[-1] == (size,)
+
+    # a rewritten dataset is parsed again from its start
+    write_cases(ontario, case_rows(6, 1500))
+    assert_cache_matches(ontario)
+    assert parses[-1] == () and len(parses) == 3
+
+
+def test_incremental_counts_match_a_full_recount(ontario, monkeypatch) -> None:
+    rows = case_rows(1, 2000)
+    assert filter.creating_covid_series(filter.uni_list, incremental=True) \
+        == filter.creating_covid_series(filter.uni_list)
+
+    # the first row counted by each incremental call, for all the universities
+    first_rows = []
+    count = filter.counting_covid_cases
+
+    def counting_covid_cases(unis, cache_dir, start_row=0, workers=1):
+        if unis:
+            first_rows.append(start_row)
+        return count(unis, cache_dir, start_row, workers)
+
+    # appended rows are added to the stored counts
+    for seed in (7, 8):
+        rows += case_rows(seed, 250)
+        write_cases(ontario, rows)
+        with monkeypatch.context() as patch:
+            patch.setattr(filter, 'counting_covid_cases', counting_covid_cases)
+            incremental = filter.creating_covid_series(filter.uni_list, incremental=True)
+        assert first_rows[-1] == len(rows) - 250
+        assert incremental == filter.creating_covid_series(filter.uni_list)
+        for uni, series in zip(filter.uni_list, incremental):
+            assert series == scalar_counts(ontario, uni.location, filter.RADIUS)
+
+    # rewritten rows are all counted again
+    write_cases(ontario, rows[:100] + case_rows(9, 1000))
+    with monkeypatch.context() as patch:
+        patch.setattr(filter, 'counting_covid_cases', counting_covid_cases)
+        incremental = filter.creating_covid_series(filter.uni_list, incremental=True)
+    assert first_rows[-1] == 0
+    assert incremental == filter.creating_covid_series(filter.uni_list)
+
+
+def test_counts_in_worker_processes_match_one_process(ontario) -> None:
+    assert filter.creating_covid_series(filter.uni_list, workers=3) \
+        == filter.creating_covid_series(filter.uni_list)
+    np.testing.assert_array_equal(filter.creating_covid_sweep(filter.uni_list, workers=3),
+                                  filter.creating_covid_sweep(filter.uni_list))
+
+
+def write_tweets(path, seed: int, count: int) -> None:
+    """Write a twint .csv file at path of count random tweets, some about COVID."""
+    rng = np.random.default_rng(seed)
+    words = ['covid', 'COVID', 'stay safe', 'social distancing', 'vaccine', 'exams',
+             'campus', 'wear a mask', 'lockdown', 'online classes']
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id'] + [f'field {i}' for i in range(1, 20)])
+        for tweet_id in range(count):
+            row = [str(tweet_id)] + [''] * 19
+            row[3] = (filter.INITIAL_DATE
+                      + datetime.timedelta(days=int(rng.integers(-10, 300)))).isoformat()
+            row[10] = ' '.join(rng.choice(words, 4))
+            row[18] = str(rng.choice(['#COVID19', '[]', '#UOFT']))
+            writer.writerow(row)
+
+
+def test_compiling_in_worker_processes_matches_one_process(ontario, tmp_path,
+                                                           monkeypatch) -> None:
+    unis = []
+    for i, uni in enumerate(filter.uni_list * 2):
+        path = tmp_path / f'tweets_{i}.csv'
+        write_tweets(path, i, 200)
+        unis.append(filter.University(f'{uni.display_name} {i}', {}, {}, uni.location,
+                                      str(path)))
+    monkeypatch.setattr(filter, 'uni_list', unis)
+
+    results = []
+    for workers in (1, 3):
+        filter.compile_universities(workers=workers, batch_size=4, radii=(1, 10))
+        results.append([(uni.impact_series, uni.covid_sweep) for uni in unis])
+    assert results[0] == results[1]
+
+    # the impact scores are those of scoring every COVID tweet of each day
+    for uni in unis:
+        with open(uni.tweet_csv_path, newline='', encoding='utf-8') as file:
+            rows = [row for row in csv.reader(file)
+                    if row[0] != 'id' and ('COVID' in row[10] or 'covid' in row[10])]
+        assert uni.impact_series == DailySeries.from_days(
+            [filter.day_offset(row[3]) for row in rows],
+            [filter.calculate_impact_score(row[10], row[18]) for row in rows])
+
+
+def test_registry_rows_become_universities(tmp_path) -> None:
+    path = tmp_path / 'universities.csv'
+    path.write_text('display_name,handle,latitude,longitude,tweet_csv_path\n'
+                    'Brock University,BrockUniversity,43.117573,-79.247692,\n'
+                    'Trent,TrentUniversity,44.357,-78.290,tweets/trent.csv\n')
+    unis = filter.load_universities(str(path))
+    assert [(uni.display_name, uni.handle, uni.location, uni.tweet_csv_path)
+            for uni in unis] == [
+        ('Brock University', 'BrockUniversity', (43.117573, -79.247692),
+         'Datasets/Tweets_Dataset_BrockUniversity.csv'),
+        ('Trent', 'TrentUniversity', (44.357, -78.29), 'tweets/trent.csv')]
+
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('Trent,trent_u,44.357,-78.290,\n')
+    with pytest.raises(ValueError):
+        filter.load_universities(str(path))
+
+
+@pytest.mark.parametrize('count', [1, 5, 24, 25, 26, 300])
+@pytest.mark.parametrize('batch_size, workers', [(25, 1), (25, 4), (1, 3), (10, 64)])
+def test_batches_cover_every_university_once(count, batch_size, workers) -> None:
+    unis = [filter.University(str(i), {}, {}, (43.0, -79.0), '') for i in range(count)]
+    lengths = [len(batch) for batch in filter.batches(unis, batch_size, workers)]
+    assert [uni for batch in filter.batches(unis, batch_size, workers) for uni in batch] \
+        == unis
+    assert lengths[0] == min(batch_size, math.ceil(count / workers))
+    assert set(lengths[:-1]) <= {lengths[0]} and lengths[-1] <= lengths[0]
+
+
+def test_radius_sweep_matches_counting_each_radius(ontario) -> None:
+    radii = (1, 2.5, 5, 10, 25)
+    sweep = filter.creating_covid_sweep(filter.uni_list, radii)
+    assert sweep.shape[:2] == (len(filter.uni_list), len(radii))
+    for uni, uni_sweep in zip(filter.uni_list, sweep):
+        for radius, weekly in zip(radii, uni_sweep):
+            expected = scalar_counts(ontario, uni.location, radius).weekly()
+            assert np.trim_zeros(weekly, 'b').tolist() == np.trim_zeros(expected, 'b').tolist()
+
+
+def test_radius_sweep_rejects_unsorted_radii(ontario) -> None:
+    with pytest.raises(ValueError):
+        filter.creating_covid_sweep(filter.uni_list, (5, 1))
+
+
+def test_day_offsets_match_parsing_each_date(monkeypatch) -> None:
+    dates = [(datetime.date(2019, 12, 25) + datetime.timedelta(days=day)).isoformat()
+             for day in range(0, 900, 7)] * 2
+
+    def parsed(initial_date: datetime.date) -> list[int]:
+        return [(datetime.datetime.strptime(date, '%Y-%m-%d').date() - initial_date).days
+                for date in dates]
+
+    assert [filter.day_offset(date) for date in dates] == parsed(filter.INITIAL_DATE)
+    assert filter.day_offsets(dates).tolist() == parsed(filter.INITIAL_DATE)
+
+    # the remembered offsets are those of the current initial date
+    monkeypatch.setattr(filter, 'INITIAL_DATE', datetime.date(2021, 1, 1))
+    assert [filter.day_offset(date) for date in dates] == parsed(datetime.date(2021, 1, 1))
+    assert filter.day_offsets(dates).tolist() == parsed(datetime.date(2021, 1, 1))
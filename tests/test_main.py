@@ -0,0 +1,28 @@
+"""
+Tests of main.py's subcommands: their arguments, and the libraries they import.
+"""
+from pathlib import Path
+
+import pytest
+
+import main
+from benchmarks import bench_startup
+
+
+@pytest.mark.parametrize('argv, command, force', [
+    ([], 'all', []),
+    (['--workers', '3'], 'all', []),
+    (['filter'], 'filter', []),
+    (['filter', '--force'], 'filter', ['filter']),
+    (['all', '--force', 'filter', 'plot'], 'all', ['filter', 'plot']),
+    (['scrape', '--fresh'], 'scrape', ['scrape'])
+])
+def test_arguments_name_the_stages_forced_to_run(argv, command, force) -> None:
+    args = main.parse_args(argv)
+    assert (args.command, args.force) == (command, force)
+
+
+@pytest.mark.parametrize('command', ['dedup', 'filter', 'correlate'])
+def test_stages_do_not_import_heavy_libraries(command, monkeypatch) -> None:
+    monkeypatch.chdir(Path(main.__file__).parent)
+    assert bench_startup.measure(command)[2] == []
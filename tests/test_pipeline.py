@@ -0,0 +1,82 @@
+"""
+Tests of pipeline.run's skipping of up-to-date stages, and of the fileio helpers it uses.
+"""
+import os
+
+import pytest
+
+import fileio
+import pipeline
+
+
+@pytest.fixture
+def stages(tmp_path) -> tuple:
+    """Return two stages, the second reading the output of the first, the paths of their
+    input and outputs, and the path of their manifest."""
+    source, middle, final = (tmp_path / name for name in ('source.txt', 'middle.txt', 'final.txt'))
+    source.write_text('cases')
+    config = {'radius': 5}
+
+    def double() -> list[str]:
+        middle.write_text(source.read_text() * 2)
+        return [str(middle)]
+
+    def upper() -> list[str]:
+        final.write_text(middle.read_text().upper())
+        return [str(final)]
+
+    return [pipeline.Stage('double', [str(source)], config, double),
+            pipeline.Stage('upper', [str(middle)], {}, upper)], \
+        (source, middle, final), str(tmp_path / 'manifest.json')
+
+
+def test_up_to_date_stages_are_skipped(stages) -> None:
+    steps, (_, _, final), manifest = stages
+    assert pipeline.run(steps, manifest_path=manifest) == ['double', 'upper']
+    assert final.read_text() == 'CASESCASES'
+    assert pipeline.run(steps, manifest_path=manifest) == []
+    assert pipeline.run(steps, force=('upper',), manifest_path=manifest) == ['upper']
+
+
+def test_changes_run_the_stages_depending_on_them(stages) -> None:
+    steps, (source, middle, final), manifest = stages
+    pipeline.run(steps, manifest_path=manifest)
+
+    source.write_text('tweets')
+    assert pipeline.run(steps, manifest_path=manifest) == ['double', 'upper']
+    assert final.read_text() == 'TWEETSTWEETS'
+
+    steps[0].config['radius'] = 10
+    assert pipeline.run(steps, manifest_path=manifest) == ['double']
+
+    final.unlink()
+    assert pipeline.run(steps, manifest_path=manifest) == ['upper']
+    middle.write_text('edited')
+    assert pipeline.run(steps, manifest_path=manifest) == ['double']
+
+
+def test_failed_writes_leave_files_unchanged(tmp_path) -> None:
+    path = tmp_path / 'data.txt'
+    path.write_text('kept')
+    with pytest.raises(RuntimeError):
+        with fileio.atomic_write(path) as file:
+            file.write('lost')
+            raise RuntimeError
+    assert os.listdir(tmp_path) == ['data.txt'] and path.read_text() == 'kept'
+
+
+def test_digests_are_only_computed_again_for_changed_files(tmp_path, monkeypatch) -> None:
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'0123456789')
+    (tmp_path / 'prefix.bin').write_bytes(b'0123')
+    files = {}
+    digest = fileio.cached_digest(path, files)
+    assert fileio.file_digests(path, 4) == (fileio.file_digest(tmp_path / 'prefix.bin'), digest)
+
+    monkeypatch.setattr(fileio, 'file_digest', lambda _: pytest.fail('hashed again'))
+    assert fileio.cached_digest(path, files) == digest
+    monkeypatch.undo()
+
+    path.write_bytes(b'01234567890')
+    assert fileio.cached_digest(path, files) == fileio.file_digest(path) != digest
+    assert fileio.cached_digest(tmp_path / 'missing', files) == ''
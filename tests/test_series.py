@@ -0,0 +1,123 @@
+"""
+Tests of series.DailySeries and series.PrefixSums against summing the days of a
+dictionary or array one by one.
+"""
+import datetime
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from series import DailySeries, PrefixSums
+
+INITIAL_DATE = datetime.date(2020, 3, 20)
+
+
+def random_days(seed: int, count: int = 500) -> tuple[list[int], list[int]]:
+    """Return count random days (some before the initial date) and their weights."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(-20, 400, count).tolist(), rng.integers(0, 9, count).tolist()
+
+
+def daily_totals(days: list[int], weights: list[int]) -> Counter:
+    """Return the total weight of each day from the initial date on."""
+    totals = Counter()
+    for day, weight in zip(days, weights):
+        if day >= 0:
+            totals[day] += weight
+    return totals
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_series_match_daily_totals(seed) -> None:
+    days, weights = random_days(seed)
+    totals = daily_totals(days, weights)
+    series = DailySeries.from_days(days, weights)
+    assert {day: count for day, count in enumerate(series.counts.tolist()) if count} \
+        == {day: count for day, count in totals.items() if count}
+    assert DailySeries.from_days(days) \
+        == DailySeries.from_days(days, [1] * len(days))
+
+
+@pytest.mark.parametrize('period', [1, 7, 10, 30])
+def test_resampling_matches_grouping_days(period) -> None:
+    days, weights = random_days(period)
+    expected = Counter()
+    for day, total in daily_totals(days, weights).items():
+        expected[day // period] += total
+
+    series = DailySeries.from_days(days, weights)
+    resampled = series.resample(period)
+    assert dict(enumerate(resampled.tolist())) == {index: expected[index]
+                                                   for index in range(len(resampled))}
+    assert len(resampled) == max(expected) + 1
+    if period == 7:
+        assert series.as_dict() == dict(enumerate(series.weekly().tolist()))
+
+
+def test_months_match_grouping_dates() -> None:
+    days, weights = random_days(11)
+    expected = Counter()
+    for day, total in daily_totals(days, weights).items():
+        date = INITIAL_DATE + datetime.timedelta(days=day)
+        expected[(date.year, date.month)] += total
+
+    monthly = DailySeries.from_days(days, weights).monthly(INITIAL_DATE).tolist()
+    assert monthly == [expected[month] for month in sorted(expected)]
+
+
+def test_sums_and_equality_ignore_trailing_days() -> None:
+    first, second = DailySeries.from_days(*random_days(1)), DailySeries.from_days([3, 3])
+    total = first + second
+    assert total.counts[3] == first.counts[3] + 2
+    assert total == second + first
+    assert DailySeries(np.array([1, 0, 2, 0, 0])) == DailySeries(np.array([1, 0, 2]))
+    assert DailySeries() == DailySeries(np.zeros(4)) != DailySeries(np.ones(1))
+
+
+def naive_total(counts: np.ndarray, start: int, stop: int) -> int:
+    """Return the total of counts from day start to day stop (excluded), days outside
+    counts counting as 0."""
+    return int(sum(counts[day] for day in range(max(start, 0), min(stop, len(counts)))))
+
+
+@pytest.fixture
+def counts() -> np.ndarray:
+    return np.random.default_rng(25).integers(0, 20, (3, 2, 90))
+
+
+def test_windows_match_naive_sums(counts) -> None:
+    sums = PrefixSums(counts)
+    for start, stop in [(0, 90), (5, 6), (-10, 3), (40, 200), (30, 30), (60, 20)]:
+        assert sums.window(start, stop).tolist() == [
+            [naive_total(one, start, stop) for one in row] for row in counts]
+    assert PrefixSums.from_series([DailySeries(one) for one in counts[1]]).sums.tolist() \
+        == sums[1].sums.tolist()
+
+
+@pytest.mark.parametrize('period, epoch, stop', [(7, 0, None), (7, -3, None), (4, 5, 33),
+                                                 (30, -40, 120), (1, 80, 95)])
+def test_resampling_matches_naive_sums(counts, period, epoch, stop) -> None:
+    resampled = PrefixSums(counts).resample(period, epoch, stop)
+    end = counts.shape[-1] if stop is None else stop
+    starts = range(epoch, end, period)
+    assert resampled.tolist() == [
+        [[naive_total(one, start, min(start + period, end)) for start in starts]
+         for one in row] for row in counts]
+    if epoch == 0 and stop is None:
+        assert resampled[0, 0].tolist() == DailySeries(counts[0, 0]).resample(period).tolist()
+
+
+def test_months_match_daily_series(counts) -> None:
+    assert PrefixSums(counts).monthly(INITIAL_DATE).tolist() == [
+        [DailySeries(one).monthly(INITIAL_DATE).tolist() for one in row] for row in counts]
+
+
+@pytest.mark.parametrize('width, start, stop', [(1, 0, None), (7, 0, None), (14, 30, 60),
+                                                (100, 0, 90), (3, 85, 95)])
+def test_rolling_windows_match_naive_sums(counts, width, start, stop) -> None:
+    rolling = PrefixSums(counts).rolling(width, start, stop)
+    end = counts.shape[-1] if stop is None else stop
+    assert rolling.tolist() == [
+        [[naive_total(one, day - width + 1, day + 1) for day in range(start, end)]
+         for one in row] for row in counts]
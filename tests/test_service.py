@@ -0,0 +1,69 @@
+"""
+Tests of service.SeriesService: concurrent requests for the same chart render it once,
+and queries are answered with 503 while there is no series store.
+"""
+import datetime
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import service
+import visualisation
+from series import DailySeries
+from store import SeriesStore
+
+NAMES = [f'University {i}' for i in range(20)]
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Serve a store of NAMES from a thread, and stop it after the test."""
+    path = str(tmp_path / 'series.npz')
+    SeriesStore(NAMES, [5.0], datetime.date(2020, 3, 20),
+                [DailySeries.from_days([i, i + 3, i + 10]) for i in range(len(NAMES))],
+                [[DailySeries.from_days([i + 1, i + 8])] for i in range(len(NAMES))]).save(path)
+    httpd = service.make_server(path, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_concurrent_requests_render_each_chart_once(server, monkeypatch) -> None:
+    renders = []
+    draw_chart = visualisation.draw_chart
+
+    def slow_draw_chart(*args, **kwargs):
+        renders.append(args[2])
+        time.sleep(0.05)
+        return draw_chart(*args, **kwargs)
+
+    monkeypatch.setattr(visualisation, 'draw_chart', slow_draw_chart)
+    urls = [f'http://127.0.0.1:{server.server_port}/chart?university=University%20{i % 20}'
+            for i in range(200)]
+    with ThreadPoolExecutor(40) as executor:
+        statuses = list(executor.map(lambda url: urlopen(url).status, urls))
+
+    assert statuses == [200] * 200
+    assert sorted(renders) == sorted(f'{name} impact scores' for name in NAMES)
+
+
+def test_errors_are_not_cached(server) -> None:
+    response, cached = server.service.respond('/series', {'university': 'Nowhere'})
+    assert response[0] == 404 and not cached
+    response, cached = server.service.respond('/series', {'university': 'Nowhere'})
+    assert response[0] == 404 and not cached
+
+
+def test_missing_store_is_unavailable(server, tmp_path) -> None:
+    (tmp_path / 'series.npz').unlink()
+    with pytest.raises(HTTPError) as error:
+        urlopen(f'http://127.0.0.1:{server.server_port}/universities')
+    assert error.value.code == 503
+    assert 'no series store' in json.loads(error.value.read())['error']
@@ -0,0 +1,156 @@
+"""
+Tests of setup.download_covid_data against a local HTTP server that supports validators
+and Range requests, and can be told to misbehave.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+import setup
+
+DATASET = b''.join(b'row %d,2020-03-%02d\n' % (i, i % 28 + 1) for i in range(2000))
+ETAG = '"v1"'
+
+
+class DatasetHandler(BaseHTTPRequestHandler):
+    """Serves DATASET with an ETag, honouring If-None-Match, Range and If-Range."""
+
+    def do_HEAD(self) -> None:
+        self.server.log.append(('HEAD', dict(self.headers)))
+        self._send(200, {'ETag': ETAG, 'Content-Length': str(len(DATASET))}, b'')
+
+    def do_GET(self) -> None:
+        self.server.log.append(('GET', dict(self.headers)))
+        if self.server.status is not None:
+            self._send(self.server.status, {}, b'')
+        elif self.headers.get('If-None-Match') == ETAG:
+            self._send(304, {'ETag': ETAG}, b'')
+        elif 'Range' in self.headers and self.headers.get('If-Range', ETAG) == ETAG:
+            start = int(self.headers['Range'][len('bytes='):].rstrip('-'))
+            if start >= len(DATASET):
+                self._send(416, {'Content-Range': f'bytes */{len(DATASET)}'}, b'')
+            else:
+                # a misbehaving server starts the range elsewhere than asked
+                start = start // 2 if self.server.wrong_start else start
+                self._send(206, {'ETag': ETAG, 'Content-Range':
+                                 f'bytes {start}-{len(DATASET) - 1}/{len(DATASET)}'},
+                           DATASET[start:])
+        else:
+            self._send(200, {'ETag': ETAG}, DATASET)
+
+    def _send(self, status: int, headers: dict, body: bytes) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if 'Content-Length' not in headers:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Keep the test output quiet."""
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), DatasetHandler)
+    httpd.log, httpd.status, httpd.wrong_start = [], None, False
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f'http://127.0.0.1:{httpd.server_port}/dataset.csv'
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _paths(directory: Path) -> tuple[Path, Path, Path]:
+    """Return the dataset, its partial download, and the validators of that download."""
+    path = directory / setup.COVID_DATA_FILE
+    partial = directory / (setup.COVID_DATA_FILE + '.part')
+    return path, partial, directory / (setup.COVID_DATA_FILE + '.part.http.json')
+
+
+def test_download_then_revalidate(server, tmp_path) -> None:
+    path, partial, _ = _paths(tmp_path)
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert path.read_bytes() == DATASET and not partial.exists()
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert server.log[-1][1].get('If-None-Match') == ETAG
+    assert path.read_bytes() == DATASET
+
+
+def test_resume_partial_download(server, tmp_path) -> None:
+    path, partial, partial_validators = _paths(tmp_path)
+    partial.write_bytes(DATASET[:1000])
+    partial_validators.write_text('{"etag": "%s"}' % ETAG.replace('"', '\\"'))
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert server.log[-1][1]['Range'] == 'bytes=1000-'
+    assert path.read_bytes() == DATASET and not partial.exists()
+
+
+def test_complete_partial_download_is_promoted(server, tmp_path) -> None:
+    path, partial, partial_validators = _paths(tmp_path)
+    partial.write_bytes(DATASET)
+    partial_validators.write_text('{"etag": "%s"}' % ETAG.replace('"', '\\"'))
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert path.read_bytes() == DATASET and not partial.exists()
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert path.read_bytes() == DATASET
+
+
+def test_range_starting_elsewhere_is_downloaded_again(server, tmp_path) -> None:
+    path, partial, partial_validators = _paths(tmp_path)
+    partial.write_bytes(DATASET[:1000])
+    partial_validators.write_text('{"etag": "%s"}' % ETAG.replace('"', '\\"'))
+    server.wrong_start = True
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert 'Range' not in server.log[-1][1]
+    assert path.read_bytes() == DATASET
+
+
+def test_truncated_dataset_without_validators_is_downloaded_again(server, tmp_path) -> None:
+    path, _, _ = _paths(tmp_path)
+    path.write_bytes(DATASET[:11])
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert [method for method, _ in server.log] == ['HEAD', 'GET']
+    assert 'If-None-Match' not in server.log[-1][1]
+    assert path.read_bytes() == DATASET
+
+    # the validators are now known, so the dataset is revalidated
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert server.log[-1][1].get('If-None-Match') == ETAG
+
+
+def test_complete_dataset_without_validators_is_kept(server, tmp_path) -> None:
+    path, _, _ = _paths(tmp_path)
+    path.write_bytes(DATASET)
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert [method for method, _ in server.log] == ['HEAD']
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert server.log[-1][1].get('If-None-Match') == ETAG
+    assert path.read_bytes() == DATASET
+
+
+def test_server_errors_keep_existing_dataset(server, tmp_path) -> None:
+    setup.download_covid_data(server.url, str(tmp_path))
+    path, _, _ = _paths(tmp_path)
+    path.write_bytes(b'local copy')
+    server.status = 500
+
+    setup.download_covid_data(server.url, str(tmp_path))
+    assert path.read_bytes() == b'local copy'
+
+
+def test_server_errors_without_dataset_raise(server, tmp_path) -> None:
+    server.status = 500
+    with pytest.raises(requests.HTTPError):
+        setup.download_covid_data(server.url, str(tmp_path))
@@ -0,0 +1,113 @@
+"""
+Tests of store.SeriesStore's queries against resampling the stored DailySeries.
+"""
+import datetime
+
+import numpy as np
+import pytest
+
+from series import DailySeries
+from store import SeriesStore
+
+INITIAL_DATE = datetime.date(2020, 3, 20)
+NAMES = ['U of T', 'Queens', 'Brock', 'Western']
+RADII = [1.0, 5.0, 25.0]
+
+
+@pytest.fixture
+def store() -> SeriesStore:
+    return SeriesStore(['U of T'], [5.0], INITIAL_DATE,
+                       [DailySeries.from_days([0, 1, 8], [3, 1, 2])],
+                       [[DailySeries.from_days([1, 1, 9])]])
+
+
+@pytest.fixture
+def stored(tmp_path) -> tuple[SeriesStore, list[DailySeries], list[list[DailySeries]]]:
+    """Return a store of random series of NAMES within RADII, saved and loaded back, and
+    the series it was made of."""
+    rng = np.random.default_rng(21)
+    impacts = [DailySeries(rng.integers(0, 5, rng.integers(0, 300)) * (rng.random() < 0.9))
+               for _ in NAMES]
+    cases = [[DailySeries(rng.integers(0, 3, rng.integers(1, 300)) * (radius > 1))
+              for radius in RADII] for _ in NAMES]
+    path = tmp_path / 'series.npz'
+    SeriesStore(NAMES, RADII, INITIAL_DATE, impacts, cases, radius=5.0).save(str(path))
+    return SeriesStore.load(str(path)), impacts, cases
+
+
+def padded(series: DailySeries, days: int) -> np.ndarray:
+    """Return the counts of series over days days."""
+    return np.pad(series.counts, (0, days - len(series)))
+
+
+def test_whole_series_are_stored(stored) -> None:
+    store, impacts, cases = stored
+    assert store.names == NAMES and store.radii.tolist() == RADII and store.radius == 5.0
+    for name, impact, uni_cases in zip(NAMES, impacts, cases):
+        for radius, radius_cases in zip(RADII, uni_cases):
+            assert store.series(name, radius) == (impact, radius_cases)
+        assert store.series(name) == (impact, uni_cases[1])
+
+
+@pytest.mark.parametrize('period', [1, 7, 30, 'month'])
+def test_queries_match_resampling(stored, period) -> None:
+    store, impacts, cases = stored
+    for name, impact, uni_cases in zip(NAMES, impacts, cases):
+        dates, impact_totals, case_totals = store.query(name, 25.0, period=period)
+        whole_impact = DailySeries(padded(impact, store.days))
+        whole_cases = DailySeries(padded(uni_cases[2], store.days))
+        if period == 'month':
+            assert impact_totals.tolist() == whole_impact.monthly(INITIAL_DATE).tolist()
+            assert case_totals.tolist() == whole_cases.monthly(INITIAL_DATE).tolist()
+            assert all(date.day == 1 for date in dates[1:])
+        else:
+            assert impact_totals.tolist() == whole_impact.resample(period).tolist()
+            assert case_totals.tolist() == whole_cases.resample(period).tolist()
+            assert dates.tolist() == [INITIAL_DATE + datetime.timedelta(days=day)
+                                      for day in range(0, store.days, period)]
+
+
+@pytest.mark.parametrize('start, end', [('2020-04-01', '2020-06-30'), ('2020-03-01', None),
+                                        (None, '2020-03-25'), ('2020-09-01', '2021-06-01')])
+def test_windows_match_slicing(stored, start, end) -> None:
+    store, impacts, cases = stored
+    first = 0 if start is None else (datetime.date.fromisoformat(start) - INITIAL_DATE).days
+    stop = store.days if end is None \
+        else (datetime.date.fromisoformat(end) - INITIAL_DATE).days + 1
+    for name, impact in zip(NAMES, impacts):
+        daily = np.concatenate([np.zeros(max(-first, 0), dtype=np.int64),
+                                padded(impact, max(stop, store.days))[max(first, 0):stop]])
+        dates, totals, _ = store.query(name, start=start, end=end, period=7)
+        assert totals.tolist() == DailySeries(daily).resample(7).tolist()[:len(dates)]
+        assert len(dates) == -(-(stop - first) // 7)
+
+
+def test_rolling_windows_match_naive_sums(stored) -> None:
+    store, impacts, _ = stored
+    for name, impact in zip(NAMES, impacts):
+        counts = padded(impact, store.days)
+        dates, totals, _ = store.rolling(name, 10, start='2020-03-25', end='2020-07-01')
+        expected = [int(counts[max(day - 9, 0):day + 1].sum())
+                    for day in range(5, (datetime.date(2020, 7, 1) - INITIAL_DATE).days + 1)]
+        assert totals.tolist() == expected
+        assert dates[0] == datetime.date(2020, 3, 25)
+
+
+def test_unknown_universities_and_radii_are_rejected(stored) -> None:
+    store, _, _ = stored
+    with pytest.raises(KeyError):
+        store.query('Nowhere')
+    with pytest.raises(KeyError):
+        store.query('U of T', radius=2.0)
+
+
+@pytest.mark.parametrize('period', [0, -7, 2.5, '7', None, True])
+def test_invalid_periods_are_rejected(store, period) -> None:
+    with pytest.raises(ValueError, match='period must be'):
+        store.query('U of T', period=period)
+
+
+@pytest.mark.parametrize('width', [0, -1, 1.5])
+def test_invalid_rolling_widths_are_rejected(store, width) -> None:
+    with pytest.raises(ValueError, match='width must be'):
+        store.rolling('U of T', width)
@@ -0,0 +1,121 @@
+"""
+Tests of Twint_Scrape's retries and incremental scraping, with twint's search replaced by
+a stub writing scripted rows (and a stand-in twint module where twint is not installed).
+"""
+import csv
+import sys
+import threading
+import types
+
+import pytest
+
+try:
+    import twint
+except ImportError:
+    twint = types.ModuleType('twint')
+    twint.Config = types.SimpleNamespace
+    twint.run = types.SimpleNamespace(Search=None)
+    sys.modules['twint'] = twint
+
+import Twint_Scrape
+
+HEADER = ['id'] + [f'field {i}' for i in range(1, 20)]
+
+
+def tweet(tweet_id: str, date: str) -> list[str]:
+    """Return a row of a twint .csv file of the tweet with tweet_id published on date."""
+    row = [tweet_id, '', '', date, '12:00:00'] + [''] * 15
+    row[10] = f'covid update {tweet_id}'
+    return row
+
+
+class StubSearch:
+    """Replaces twint.run.Search, doing what its script says on each call: 'fail' raises
+    an error, 'hang' writes part of its output and waits until released, and a list of
+    rows is written as the output."""
+
+    def __init__(self, *script) -> None:
+        self.script = list(script)
+        self.outputs = []
+        self.released = threading.Event()
+
+    def __call__(self, config) -> None:
+        self.outputs.append(config.Output)
+        action = self.script.pop(0)
+        if action == 'fail':
+            raise RuntimeError('search failed')
+        with open(config.Output, 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerow(HEADER)
+            if action == 'hang':
+                file.flush()
+                self.released.wait()
+            else:
+                csv.writer(file).writerows(action)
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """Return a function installing a StubSearch with the given script."""
+    def install(*script) -> StubSearch:
+        stub = StubSearch(*script)
+        monkeypatch.setattr(Twint_Scrape.twint.run, 'Search', stub)
+        return stub
+    return install
+
+
+def read_ids(path) -> list[str]:
+    """Return the ids of the tweets stored at path."""
+    with open(path, newline='', encoding='utf-8') as file:
+        return [row[0] for row in csv.reader(file) if row and row[0] != 'id']
+
+
+def partials(tmp_path) -> list[str]:
+    """Return the names of the partial searches left in tmp_path."""
+    return sorted(path.name for path in tmp_path.glob('*.part*'))
+
+
+def test_failed_and_timed_out_attempts_are_retried(search, tmp_path) -> None:
+    stub = search('fail', 'hang', [tweet('2', '2021-01-02'), tweet('1', '2021-01-01')])
+    name = Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path), timeout=0.5,
+                                                     retries=2, backoff=0)
+    stub.released.set()
+
+    assert len(stub.outputs) == 3
+    assert read_ids(tmp_path / name) == ['2', '1']
+    assert partials(tmp_path) == []
+
+
+def test_every_attempt_failing_raises_last_error(search, tmp_path) -> None:
+    search('fail', 'fail')
+    with pytest.raises(RuntimeError):
+        Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path), retries=1, backoff=0)
+    assert not (tmp_path / Twint_Scrape.dataset_filename('uoft')).exists()
+
+
+def test_stale_partial_searches_are_removed(search, tmp_path) -> None:
+    for stale in ('.part0', '.part2'):
+        (tmp_path / (Twint_Scrape.dataset_filename('uoft') + stale)).write_text('id\n')
+    search('fail')
+    with pytest.raises(RuntimeError):
+        Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path), retries=0)
+    assert partials(tmp_path) == []
+
+
+def test_incremental_scrape_appends_newer_tweets(search, tmp_path) -> None:
+    search([tweet('2', '2021-01-02'), tweet('1', '2021-01-01')],
+           [tweet('3', '2021-01-03'), tweet('2', '2021-01-02')])
+    name = Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path))
+    Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path))
+
+    assert read_ids(tmp_path / name) == ['2', '1', '3']
+    assert Twint_Scrape._newest_tweet(tmp_path / name)['id'] == 3
+
+
+def test_rows_without_valid_ids_are_skipped(search, tmp_path) -> None:
+    search([tweet('2', '2021-01-02'), tweet('', '2021-01-05'), tweet('n/a', '2021-01-06')],
+           [tweet('3', '2021-01-03'), tweet('x', '2021-01-07')])
+    name = Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path))
+    assert Twint_Scrape._newest_tweet(tmp_path / name) == {'id': 2, 'date': '2021-01-02 12:00:00'}
+
+    Twint_Scrape.collect_tweets_with_retries('uoft', str(tmp_path))
+    assert read_ids(tmp_path / name) == ['2', '', 'n/a', '3']
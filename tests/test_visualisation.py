@@ -0,0 +1,54 @@
+"""
+Tests of visualisation.fit_trendlines against fitting every series on its own, and of
+rendering charts in worker processes.
+"""
+import numpy as np
+import pytest
+from numpy.polynomial import chebyshev
+
+import filter
+import visualisation
+
+
+def test_trendlines_match_fitting_each_series_alone() -> None:
+    rng = np.random.default_rng(18)
+    series = [rng.integers(0, 50, size=length) for length in (3, 10, 10, 25, 25, 25, 60)]
+    lines = visualisation.fit_trendlines(series)
+
+    for y, line in zip(series, lines):
+        weeks = np.linspace(-1, 1, len(y))
+        fit = chebyshev.Chebyshev.fit(weeks, y, min(visualisation.DEGREE, len(y) - 1),
+                                      domain=[-1, 1])
+        assert line.values == pytest.approx(fit(weeks))
+        assert len(line.values) == len(y)
+
+
+def test_trendline_does_not_depend_on_other_series() -> None:
+    alone = visualisation.fit_trendlines([np.array([0, 2, 4])], degree=1)[0]
+    batched = visualisation.fit_trendlines([np.array([0, 2, 4]), np.arange(40) % 7],
+                                           degree=1)[0]
+    assert alone.r_squared == batched.r_squared == 1.0
+    assert batched.values.tolist() == pytest.approx([0, 2, 4])
+
+
+def test_series_without_variance_have_no_trendline() -> None:
+    assert visualisation.fit_trendlines([np.zeros(5), np.array([3, 3]), np.array([])]) \
+        == [None, None, None]
+
+
+def test_charts_rendered_in_worker_processes_match_one_process(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'output').mkdir()
+    rng = np.random.default_rng(9)
+    unis = [filter.University(f'University {i}', dict(enumerate(rng.integers(0, 50, 40))),
+                              dict(enumerate(rng.integers(0, 9, 30 + i))), (43.0, -79.0), '')
+            for i in range(5)]
+
+    rendered = []
+    for workers in (1, 3):
+        paths = visualisation.render_charts(unis=unis, workers=workers, draft=True,
+                                            batch_size=2)
+        rendered.append({path.name: path.read_bytes() for path in paths})
+    assert rendered[0] == rendered[1]
+    assert sorted(rendered[0]) == sorted(f'{kind}_University {i}.png'
+                                         for kind in ('impact', 'covid') for i in range(5))
@@ -1,107 +1,255 @@
 """
 Takes classes using filter.py as data, outputs graphs.
+
+Charts are drawn on their own matplotlib Figure (rendered with Agg) rather than through
+pyplot's global state, so that several can be rendered at once in separate processes.
 """
+from concurrent.futures import ProcessPoolExecutor
+import io
 from pathlib import Path
-import matplotlib.pyplot as plt
+from typing import Callable, Optional
+
+from matplotlib.figure import Figure
 import numpy as np
+from numpy.polynomial.chebyshev import chebvander
 import filter
+import instrument
+
+# Resolution and file format of the exported charts, and of quicker draft charts
+DPI = 300
+FORMAT = 'jpeg'
+DRAFT_DPI = 72
+DRAFT_FORMAT = 'png'
+
+# Degree of the polynomial trendline fitted to every chart's series
+DEGREE = 12
+
+# Weekly series plotted by each chart, as the name of the University attribute holding it
+CHART_SERIES = {'graph_uni_impact_score': 'impact_dic',
+                'graph_individual_regional_covid': 'covid_dic'}
 
 ###############################################################################
 # Part 1 - Visualizing impact scores
 ###############################################################################
 
 
-def plot_covid():
-    for uni in filter.uni_list:
-        graph_individual_regional_covid(uni)
+def plot_covid(workers: int = 1, draft: bool = False) -> list[Path]:
+    return render_charts([graph_individual_regional_covid], workers=workers, draft=draft)
 
 
-def plot_impacts():
-    for uni in filter.uni_list:
-        graph_uni_impact_score(uni)
+def plot_impacts(workers: int = 1, draft: bool = False) -> list[Path]:
+    return render_charts([graph_uni_impact_score], workers=workers, draft=draft)
 
 
-def graph_uni_impact_score(uni: filter.University):
-    """Graphs a universities' impact scores against """
-    # x axis values
-    x = np.array([x for x in uni.impact_dic.keys()])
-    # y axis values
-    y = np.array([x for x in uni.impact_dic.values()])
-    plt.axes().set_xlim(0, 80)
-    # plotting the points
-    plt.plot(x, y, 'o', color='b', label='data')
+def render_charts(graphs: Optional[list[Callable[..., Path]]] = None,
+                  unis: Optional[list[filter.University]] = None,
+                  workers: int = 1, draft: bool = False,
+                  batch_size: int = filter.BATCH_SIZE) -> list[Path]:
+    """Renders every chart in graphs (by default, impact scores and COVID-cases) for every
+    university in unis (by default, filter.uni_list) and returns the saved files' paths.
 
-    # naming the x-axis
-    plt.xlabel('Weeks since March 20, 2020')
+    The trendlines of all the charts whose series is listed in CHART_SERIES are fitted
+    together before any is rendered. The charts of batch_size universities (fewer if there
+    would not be a batch for every worker) are rendered together; with more than one worker,
+    the batches are rendered in that many processes.
+    Draft charts are saved at DRAFT_DPI in DRAFT_FORMAT, which is much faster for iterating.
+    """
+    if graphs is None:
+        graphs = [graph_uni_impact_score, graph_individual_regional_covid]
+    if unis is None:
+        unis = filter.uni_list
 
-    # naming the y-axis
-    plt.ylabel('Cumulative impact score')
+    fitted_graphs = [graph for graph in graphs if graph.__name__ in CHART_SERIES]
+    fits = fit_trendlines([np.array(list(getattr(uni, CHART_SERIES[graph.__name__]).values()))
+                           for graph in fitted_graphs for uni in unis])
+    trendlines = {graph: fits[index * len(unis):(index + 1) * len(unis)]
+                  for index, graph in enumerate(fitted_graphs)}
 
-    z = np.polyfit(x, y, 12)
-    p = np.poly1d(z)
+    length = filter.batch_length(len(unis), batch_size, workers)
+    task_batches = [[(graph, uni, trendlines[graph][index] if graph in trendlines else None)
+                     for graph in graphs
+                     for index, uni in enumerate(unis[start:start + length], start)]
+                    for start in range(0, len(unis), length)]
+    names = [filter.batch_name('charts', unis[start:start + length])
+             for start in range(0, len(unis), length)]
+    drafts = [draft] * len(task_batches)
 
-    plt.plot(x, p(x), "r-", label='trendline')
+    paths = []
+    if workers > 1 and len(task_batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch_paths, records in executor.map(instrument.in_worker, names,
+                                                     [_render_batch] * len(task_batches),
+                                                     task_batches, drafts):
+                instrument.adopt(records)
+                paths.extend(batch_paths)
+    else:
+        for name, tasks in zip(names, task_batches):
+            with instrument.stage(name):
+                paths.extend(_render_batch(tasks, draft))
 
-    # r-squared
-    yhat = p(x)
-    ybar = np.sum(y) / len(y)
-    ssreg = np.sum((yhat - ybar) ** 2)
-    sstot = np.sum((y - ybar) ** 2)
-    r_sq = round((ssreg / sstot), 3)
+    instrument.count('charts rendered', len(paths))
+    return paths
 
-    # title
-    title = f'{uni.display_name} impact scores (r-squared = {str(r_sq)})'
-    plt.title(title)
 
-    # plot settings
-    plt.xticks(range(min(x), max(x), 10))
+def _render_batch(tasks: list[tuple[Callable[..., Path], filter.University,
+                                    Optional['Trendline']]],
+                  draft: bool) -> list[Path]:
+    """Returns the paths of graph(uni, draft, trendline) for every (graph, uni, trendline)
+    in tasks, so that batches of charts can be mapped over in a process pool."""
+    return [graph(uni, draft, trendline) for graph, uni, trendline in tasks]
+
+
+def graph_uni_impact_score(uni: filter.University, draft: bool = False,
+                           trendline: Optional['Trendline'] = None) -> Path:
+    """Graphs a universities' impact scores against weeks since March 20, 2020, and
+    returns the path of the saved chart. The trendline of the impact scores is fitted
+    unless given."""
+    figure = draw_chart(list(uni.impact_dic.keys()), list(uni.impact_dic.values()),
+                        f'{uni.display_name} impact scores', 'Weeks since March 20, 2020',
+                        'Cumulative impact score', 'b', trendline)
     # function to save the plot
-    plt.savefig(Path('output') / ('impact_' +
-                uni.display_name + '.jpeg'), dpi=300)
-    plt.clf()
+    return _save(figure, 'impact_' + uni.display_name, draft)
+
+
+def graph_individual_regional_covid(uni: filter.University, draft: bool = False,
+                                    trendline: Optional['Trendline'] = None) -> Path:
+    """Returns the path of the graph of a singular CSV file,
+    plotting COVID-19 cases against weeks since March 20, 2020. The trendline of the cases
+    is fitted unless given."""
+    figure = draw_chart(list(uni.covid_dic.keys()), list(uni.covid_dic.values()),
+                        f'{uni.display_name} related COVID-cases',
+                        'Weeks since March 20, 2020', 'COVID-cases', 'g', trendline)
+    # function to save plot
+    return _save(figure, 'covid_' + uni.display_name, draft)
 
 
-def graph_individual_regional_covid(uni: filter.University):
-    """Returns the graph of a singular CSV file, 
-    plotting COVID-19 cases against day since March 20, 2020. """
+def draw_chart(x: list, y: list, title: str, xlabel: str, ylabel: str, color: str,
+               trendline: Optional['Trendline'] = None, xlim: Optional[int] = 80) -> Figure:
+    """Returns a new figure plotting the points (x, y) in color, and their trendline
+    (fitted unless given) with its r-squared in the title. The x axis spans 0 to xlim,
+    or just the points if xlim is None."""
     # x axis values
-    x = np.array([x for x in uni.covid_dic.keys()])
+    x = np.array(x)
     # y axis values
-    y = np.array([y for y in uni.covid_dic.values()])
-    plt.axes().set_xlim(0, 80)
+    y = np.array(y)
+
+    figure = Figure()
+    axes = figure.subplots()
+    if xlim is not None:
+        axes.set_xlim(0, xlim)
 
     # plotting the points
-    plt.plot(x, y, 'o', color='g', label='data')
+    axes.plot(x, y, 'o', color=color, label='data')
 
     # naming the x-axis
-    plt.xlabel('Weeks since March 20, 2020')
+    axes.set_xlabel(xlabel)
 
     # naming the y-axis
-    plt.ylabel('COVID-cases')
-
-    z = np.polyfit(x, y, 12)
-    p = np.poly1d(z)
+    axes.set_ylabel(ylabel)
 
-    plt.plot(x, p(x), "r-", label='trendline')
+    if trendline is None:
+        trendline = fit_trendlines([y])[0]
 
-    # r-squared
-    yhat = p(x)
-    ybar = np.sum(y) / len(y)
-    ssreg = np.sum((yhat - ybar) ** 2)
-    sstot = np.sum((y - ybar) ** 2)
-    r_sq = round((ssreg / sstot), 3)
+    # trendline and its r-squared, if there is anything to fit
+    r_sq = None
+    if trendline is not None:
+        axes.plot(x, trendline.values, "r-", label='trendline')
+        r_sq = trendline.r_squared
 
     # title
-    title = f'{uni.display_name} related COVID-cases (r-squared = {str(r_sq)})'
-    plt.title(title)
+    axes.set_title(f'{title} (r-squared = {str(r_sq)})')
 
     # plot settings
-    plt.xticks(range(min(x), max(x), 10))
+    axes.set_xticks(range(0, max(x, default=0), 10))
+    return figure
 
-    # function to save plot
-    plt.savefig(Path('output') / ('covid_' +
-                uni.display_name + '.jpeg'), dpi=300)
-    plt.clf()
+
+def chart_bytes(figure: Figure, draft: bool = True) -> bytes:
+    """Returns figure rendered like a saved chart, without saving it."""
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=DRAFT_FORMAT if draft else FORMAT,
+                   dpi=DRAFT_DPI if draft else DPI)
+    return buffer.getvalue()
+
+
+def _save(figure: Figure, name: str, draft: bool) -> Path:
+    """Saves figure as the chart called name under ./output and returns its path."""
+    path = Path('output') / f'{name}.{DRAFT_FORMAT if draft else FORMAT}'
+    figure.savefig(path, dpi=DRAFT_DPI if draft else DPI)
+    return path
+
+
+###############################################################################
+# Part 2 - Fitting trendlines
+###############################################################################
+
+
+class Trendline:
+    """
+    The least-squares polynomial trendline of a weekly series, in the Chebyshev basis of
+    its weeks scaled to [-1, 1], where high degrees stay well conditioned.
+
+    Instance Attributes:
+        - coefficients: the Chebyshev coefficients of the trendline
+        - values: the value of the trendline at every week of the series
+        - r_squared: the share of the series' variance explained by the trendline,
+          rounded to 3 decimals
+
+    Representation Invariants:
+        - 0 <= self.r_squared
+    """
+    coefficients: np.ndarray
+    values: np.ndarray
+    r_squared: float
+
+    def __init__(self, coefficients: np.ndarray, values: np.ndarray,
+                 r_squared: float) -> None:
+        self.coefficients = coefficients
+        self.values = values
+        self.r_squared = r_squared
+
+
+def fit_trendlines(series: list[np.ndarray], degree: int = DEGREE) \
+        -> list[Optional[Trendline]]:
+    """Returns the trendline of degree (at most) degree of every weekly series in series,
+    in the same order, or None for the series without any variance to explain (such as a
+    university without any COVID-cases nearby).
+
+    Series of the same length share their weeks, so each group of them is fitted with a
+    single least-squares solve on the same design matrix.
+
+    >>> lines = fit_trendlines([np.array([1, 2, 3, 4]), np.array([0, 2, 4, 6]), np.array([5, 5])])
+    >>> [line.r_squared for line in lines[:2]], lines[2]
+    ([1.0, 1.0], None)
+    >>> np.round(lines[1].values, 6).tolist()
+    [0.0, 2.0, 4.0, 6.0]
+    """
+    trendlines = [None] * len(series)
+    groups = {}
+    for index, y in enumerate(series):
+        groups.setdefault(len(y), []).append(index)
+
+    for length, indices in groups.items():
+        if length == 0:
+            continue
+
+        # Design matrix of the weeks scaled to [-1, 1], and each series as a column of ys
+        design = chebvander(np.linspace(-1, 1, length), min(degree, length - 1))
+        ys = np.array([series[index] for index in indices], dtype=float).T
+        coefficients = np.linalg.lstsq(design, ys, rcond=None)[0]
+        yhat = design @ coefficients
+
+        # r-squared of every series
+        ybar = ys.mean(axis=0)
+        ssreg = np.sum((yhat - ybar) ** 2, axis=0)
+        sstot = np.sum((ys - ybar) ** 2, axis=0)
+
+        for column, index in enumerate(indices):
+            if sstot[column] > 0:
+                trendlines[index] = Trendline(coefficients[:, column], yhat[:, column],
+                                              round(float(ssreg[column] / sstot[column]), 3))
+
+    return trendlines
 
 
 if __name__ == '__main__':